@@ -0,0 +1,36 @@
+#!/bin/bash
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
+SOURCE_DIR="$(dirname $SCRIPT_DIR)"
+
+RUNS=${RUNS:-20}
+LIMIT_MS=${LIMIT_MS:-100}
+
+# Median wall time of "transx version" next to a bare interpreter start
+pushd $SOURCE_DIR/transx > /dev/null
+poetry run python - "$RUNS" "$LIMIT_MS" <<'PYEOF'
+import statistics
+import subprocess
+import sys
+import time
+
+runs, limit_ms = int(sys.argv[1]), float(sys.argv[2])
+
+
+def median_ms(*args):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+bare_ms = median_ms("-c", "pass")
+version_ms = median_ms("-m", "transx.main", "version")
+print(f"python: {bare_ms:.1f}ms")
+print(f"transx version: {version_ms:.1f}ms (limit {limit_ms:.0f}ms)")
+sys.exit(0 if version_ms <= limit_ms else 1)
+PYEOF
+STATUS=$?
+popd > /dev/null
+exit $STATUS
@@ -1,11 +1,12 @@
 from fastapi import FastAPI, UploadFile, File
 from boto3 import client
+from botocore.config import Config
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 from fastapi.responses import RedirectResponse
 from api.auth import verify_token
-from api.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, BUCKET_NAME
+from api.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, BUCKET_NAME, AWS_MAX_POOL_CONNECTIONS, AWS_MAX_ATTEMPTS
 app = FastAPI()
 
 load_dotenv()
@@ -24,7 +25,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-s3 = client('s3')
+# one client per process, its connection pool is shared by all requests
+s3 = client('s3', config=Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': AWS_MAX_ATTEMPTS}))
 
 @app.get("/auth/callback")  
 async def auth_callback(token: str):
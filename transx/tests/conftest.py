@@ -0,0 +1,33 @@
+import pytest
+from transx import config, vimeo
+from .fakes import FakeVimeoServer
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    """A media directory with its state dir, so the state of the tests stays in it."""
+    (tmp_path / config.Config.STATE_DIR.resolve()).mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """Sets TX_ settings for the test only."""
+    def set_settings(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(f"TX_{name}", str(value))
+        config.settings.reload()
+    yield set_settings
+    monkeypatch.undo()
+    config.settings.reload()
+
+
+@pytest.fixture
+def vimeo_server(settings, monkeypatch):
+    """A fake vimeo server the vimeo module talks to, with a fresh client and rate limiter."""
+    with FakeVimeoServer() as server:
+        settings(VIMEO_API_URL=server.url, VIMEO_USER_ID=server.user_id, VIMEO_ACCESS_TOKEN="token", VIMEO_RATE=1000)
+        monkeypatch.setattr(vimeo, "vimeo_cli", None)
+        monkeypatch.setattr(vimeo, "_limiter", None)
+        monkeypatch.setenv("USER", "tester")
+        yield server
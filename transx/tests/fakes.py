@@ -0,0 +1,321 @@
+"""Local stand-ins for the remote services, to test transx offline."""
+import hashlib
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import xml.etree.ElementTree as ET
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from transx.jobs import JobAdapter
+
+
+class FakeJobAdapter(JobAdapter):
+    """A job service whose jobs finish after a number of polls."""
+
+    name = "fake"
+    min_interval = 0
+    max_interval = 0
+    timeout = 60
+
+    def __init__(self):
+        self.jobs = {}
+        self.describes = 0
+        self.lock = threading.Lock()
+
+    def submit(self, job_id, polls=1, status="COMPLETED"):
+        self.jobs[job_id] = {"JobId": job_id, "Status": "IN_PROGRESS", "polls": polls, "final": status}
+
+    def describe(self, job_id):
+        with self.lock:
+            self.describes += 1
+            job = self.jobs[job_id]
+            job["polls"] -= 1
+            if job["polls"] <= 0:
+                job["Status"] = job["final"]
+            return dict(job)
+
+
+class FakeS3:
+    """An in memory bucket store, with the calls transx uses to sync files and fetch results."""
+
+    def __init__(self):
+        self.objects = {}
+        self.part_sizes = {}
+        self.lock = threading.Lock()
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        config = Config or TransferConfig()
+        with open(Filename, "rb") as f:
+            body = f.read()
+        with self.lock:
+            self.objects[(Bucket, Key)] = body
+            self.part_sizes[(Bucket, Key)] = config.multipart_chunksize if len(body) >= config.multipart_threshold else None
+
+    def head_object(self, Bucket, Key):
+        with self.lock:
+            body = self.objects.get((Bucket, Key))
+            part_size = self.part_sizes.get((Bucket, Key))
+        if body is None:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        if part_size:
+            digests = [hashlib.md5(body[i:i + part_size]).digest() for i in range(0, len(body), part_size)]
+            etag = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+        else:
+            etag = hashlib.md5(body).hexdigest()
+        return {"ETag": f'"{etag}"', "ContentLength": len(body)}
+
+    def put_object(self, Bucket, Key, Body):
+        with self.lock:
+            self.objects[(Bucket, Key)] = Body
+
+    def download_file(self, Bucket, Key, Filename):
+        with self.lock:
+            body = self.objects[(Bucket, Key)]
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+
+class FakePolly:
+    """Speech synthesis tasks that finish after a number of polls, writing their SSML to the fake S3 as audio."""
+
+    def __init__(self, s3=None, polls=1, region="us-east-1"):
+        self.s3 = s3 or FakeS3()
+        self.polls = polls
+        self.region = region
+        self.tasks = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def start_speech_synthesis_task(self, OutputS3BucketName, OutputS3KeyPrefix, OutputFormat, Text, **kwargs):
+        with self.lock:
+            task_id = f"task-{next(self.ids)}"
+            key = f"{OutputS3KeyPrefix}.{task_id}.{OutputFormat}"
+            task = {
+                "TaskId": task_id,
+                "TaskStatus": "scheduled",
+                "OutputUri": f"https://s3.{self.region}.amazonaws.com/{OutputS3BucketName}/{key}",
+                "OutputFormat": OutputFormat,
+                "polls": self.polls,
+                "bucket": OutputS3BucketName,
+                "key": key,
+                "text": Text,
+            } | kwargs
+            self.tasks[task_id] = task
+            return {"SynthesisTask": dict(task)}
+
+    def get_speech_synthesis_task(self, TaskId):
+        with self.lock:
+            task = self.tasks[TaskId]
+            task["polls"] -= 1
+            if task["polls"] <= 0 and task["TaskStatus"] == "scheduled":
+                try:
+                    ET.fromstring(task["text"])
+                    self.s3.put_object(Bucket=task["bucket"], Key=task["key"], Body=task["text"].encode())
+                    task["TaskStatus"] = "completed"
+                except ET.ParseError as e:
+                    task["TaskStatus"] = "failed"
+                    task["TaskStatusReason"] = f"Invalid SSML: {e}"
+            return {"SynthesisTask": dict(task)}
+
+
+class FakeVimeoServer:
+    """A local HTTP server answering the vimeo API and tus calls transx makes, with a rate limit budget.
+
+    Every API request spends the budget, which refills `limit` requests every `window`
+    seconds, and is answered with 429 when it is spent. Point VIMEO_API_URL at `url`.
+    """
+
+    def __init__(self, limit=100, window=60, user_id="1", tus_delay=0, fail_at=None):
+        self.limit = limit
+        self.window = window
+        self.user_id = user_id
+        self.tus_delay = tus_delay
+        # the first tus request past this many bytes of an upload fails, as a dropped connection would
+        self.fail_at = fail_at
+        self.tus_bytes = 0
+        self.remaining = limit
+        self.reset_at = time.time() + window
+        self.projects = []
+        self.items = {}
+        self.uploads = {}
+        self.tracks = {}
+        self.track_files = {}
+        self.track_count = 0
+        self.requests = []
+        self.throttled = 0
+        self.active_uploads = 0
+        self.max_active_uploads = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _vimeo_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def upload_url(self):
+        """Root of the upload links, another host than the API as in vimeo, answered by the same server."""
+        return f"http://localhost:{self.server.server_address[1]}"
+
+    def add_project(self, name):
+        with self.lock:
+            project = {"name": name, "uri": f"/users/{self.user_id}/projects/{len(self.projects) + 1}"}
+            self.projects.append(project)
+            self.items[project["uri"]] = []
+            return project
+
+    def spend(self):
+        """Spends a request of the budget, returning the rate limit headers and whether it was throttled."""
+        with self.lock:
+            now = time.time()
+            if now >= self.reset_at:
+                self.remaining = self.limit
+                self.reset_at = now + self.window
+            throttled = self.remaining <= 0
+            if throttled:
+                self.throttled += 1
+            else:
+                self.remaining -= 1
+            reset = datetime.fromtimestamp(self.reset_at, timezone.utc).isoformat()
+            headers = {"X-RateLimit-Limit": str(self.limit),
+                       "X-RateLimit-Remaining": str(self.remaining),
+                       "X-RateLimit-Reset": reset}
+            return headers, throttled
+
+    def api(self, method, path, query, body):
+        """Status and body of an API request."""
+        parts = path.strip("/").split("/")
+        if parts[:1] == ["users"] and parts[2:] == ["projects"]:
+            if method == "GET":
+                return 200, self.page(self.projects, path, query)
+            return 201, self.add_project(body["name"])
+        if parts[:1] == ["users"] and parts[2:3] == ["projects"] and parts[4:] == ["items"]:
+            return 200, self.page(self.items.get("/" + "/".join(parts[:4]), []), path, query)
+        if parts == ["me", "videos"]:
+            with self.lock:
+                video_id = str(len(self.uploads) + 1)
+                video = {"uri": f"/videos/{video_id}", "name": body.get("name"),
+                         "metadata": {"connections": {"texttracks": {"uri": f"/videos/{video_id}/texttracks"}}}}
+                self.uploads[video_id] = {"size": body["upload"]["size"], "data": bytearray()}
+                self.tracks[video_id] = []
+                if body.get("folder_uri") in self.items:
+                    self.items[body["folder_uri"]].append({"type": "video", "video": video})
+            return 200, video | {"upload": {"upload_link": f"{self.upload_url}/tus/{video_id}"}}
+        if parts[:1] == ["videos"] and parts[2:] == ["texttracks"]:
+            tracks = self.tracks.setdefault(parts[1], [])
+            if method == "GET":
+                return 200, self.page(tracks, path, query)
+            with self.lock:
+                self.track_count += 1
+                track_uri = f"{path}/{self.track_count}"
+                track = body | {"uri": track_uri, "link": f"{self.upload_url}/texttrack-upload{track_uri}", "active": False}
+                tracks.append(track)
+            return 201, track
+        if parts[:1] == ["videos"] and parts[2:3] == ["texttracks"] and method in ("PATCH", "DELETE"):
+            tracks = self.tracks.get(parts[1], [])
+            for track in tracks:
+                if track["uri"] == path:
+                    if method == "DELETE":
+                        tracks.remove(track)
+                        return 204, None
+                    track.update(body)
+                    return 200, track
+        return 404, {"error": f"No route for {method} {path}"}
+
+    def page(self, data, path, query):
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", ["25"])[0])
+        chunk = data[(page - 1) * per_page:page * per_page]
+        next_page = f"{path}?page={page + 1}&per_page={per_page}" if page * per_page < len(data) else None
+        return {"data": chunk, "paging": {"next": next_page}}
+
+
+def _vimeo_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body=None, headers=None):
+            payload = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def tus(self, video_id):
+            upload = fake.uploads[video_id]
+            headers = {"Tus-Resumable": "1.0.0"}
+            if self.command == "HEAD":
+                return self.reply(200, headers=headers | {"Upload-Offset": str(len(upload["data"])),
+                                                          "Upload-Length": str(upload["size"])})
+            with fake.lock:
+                fake.active_uploads += 1
+                fake.max_active_uploads = max(fake.max_active_uploads, fake.active_uploads)
+            try:
+                time.sleep(fake.tus_delay)
+                data = self.read_body()
+                if int(self.headers["Upload-Offset"]) != len(upload["data"]):
+                    return self.reply(409, headers=headers)
+                with fake.lock:
+                    fake.tus_bytes += len(data)
+                    failing = fake.fail_at is not None and len(upload["data"]) + len(data) > fake.fail_at
+                    if failing:
+                        fake.fail_at = None
+                if failing:
+                    return self.reply(500, headers=headers)
+                upload["data"].extend(data)
+                self.reply(204, headers=headers | {"Upload-Offset": str(len(upload["data"]))})
+            finally:
+                with fake.lock:
+                    fake.active_uploads -= 1
+
+        def handle_any(self):
+            url = urlparse(self.path)
+            with fake.lock:
+                fake.requests.append((self.command, url.path))
+            if url.path.startswith("/tus/"):
+                return self.tus(url.path.split("/")[2])
+            if url.path.startswith("/texttrack-upload/"):
+                fake.track_files[url.path[len("/texttrack-upload"):]] = self.read_body()
+                return self.reply(200)
+            headers, throttled = fake.spend()
+            if throttled:
+                self.read_body()
+                return self.reply(429, {"error": "Too many API requests"}, headers)
+            raw = self.read_body()
+            body = json.loads(raw) if raw else {}
+            status, result = fake.api(self.command, url.path, parse_qs(url.query), body)
+            self.reply(status, result, headers)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_HEAD = do_DELETE = handle_any
+
+    return Handler
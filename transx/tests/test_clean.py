@@ -0,0 +1,98 @@
+import os
+from pathlib import Path
+from transx import clean, manifest
+
+
+def write_files(directory, *names):
+    paths = []
+    for name in names:
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+        paths.append(path.resolve())
+    return paths
+
+
+def no_walk(*args, **kwargs):
+    raise AssertionError("clean walked the directory")
+
+
+def test_clean_deletes_the_recorded_files_only(media_dir, monkeypatch):
+    media, user_file = write_files(media_dir, "a/lesson.mp4", "a/subs/notes.vtt")
+    outputs = write_files(media_dir, "a/subs/lesson.en.vtt", "b/subs/intro.pt.vtt", "b/subtitles/intro.es.vtt")
+    manifest.record(*outputs, directory=media_dir)
+    # a state dir left in a course by an earlier run is not where this run records
+    (media_dir / "a" / ".transx").mkdir()
+    outputs += write_files(media_dir, "a/subs/lesson.es.vtt")
+    manifest.record(outputs[-1], directory=media_dir)
+    monkeypatch.setattr(os, "walk", no_walk)
+    monkeypatch.setattr(clean, "index_files", no_walk)
+    clean.clean_directory(media_dir)
+    assert not [output for output in outputs if output.exists()]
+    assert media.exists() and user_file.exists()
+    assert manifest.read(media_dir) == []
+    assert not manifest.manifest_path(media_dir / "a").exists()
+
+
+def test_clean_of_a_subdirectory_reads_the_manifest_above(media_dir, monkeypatch):
+    a_output, b_output = write_files(media_dir, "a/subs/lesson.en.vtt", "b/subs/intro.en.vtt")
+    manifest.record(a_output, b_output, directory=media_dir)
+    monkeypatch.setattr(os, "walk", no_walk)
+    clean.clean_directory(media_dir / "b")
+    assert a_output.exists() and not b_output.exists()
+    assert manifest.read(media_dir) == [a_output]
+
+
+def test_clean_keeps_the_files_it_failed_to_delete_in_the_manifest(media_dir, monkeypatch):
+    kept, deleted, missing = write_files(media_dir, "a/subs/kept.en.vtt", "a/subs/deleted.en.vtt",
+                                         "a/subs/missing.en.vtt")
+    manifest.record(kept, deleted, missing, directory=media_dir)
+    missing.unlink()
+    unlink = Path.unlink
+
+    def failing_unlink(path, *args):
+        if path == kept:
+            raise PermissionError(f"Permission denied: {path}")
+        return unlink(path, *args)
+
+    monkeypatch.setattr(Path, "unlink", failing_unlink)
+    freed = clean.clean_directory(media_dir)
+    assert freed == len("a/subs/deleted.en.vtt")
+    assert kept.exists() and not deleted.exists()
+    assert manifest.read(media_dir) == [kept]
+
+
+def test_clean_without_manifest_deletes_the_outputs_in_the_index(tmp_path):
+    media, user_file, sub, transcript, ssml_file = write_files(
+        tmp_path, "a/lesson.mp4", "a/notes.txt", "a/subs/lesson.en.vtt", "a/lesson.transcribe.json",
+        "a/lesson.en.ssml")
+    media_in_subs, = write_files(tmp_path, "a/subs/intro.mp4")
+    clean.clean_directory(tmp_path)
+    assert not sub.exists() and not transcript.exists() and not ssml_file.exists()
+    assert media.exists() and user_file.exists() and media_in_subs.exists()
+
+
+class ListingS3:
+    """A versioned bucket listed in one page, failing any call that would delete."""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def get_bucket_versioning(self, Bucket):
+        return {"Status": "Enabled"}
+
+    def get_paginator(self, operation):
+        assert operation == "list_object_versions"
+        return self
+
+    def paginate(self, **kwargs):
+        yield {"Versions": [{"Key": key, "VersionId": "1"} for key in self.keys]}
+
+    def __getattr__(self, name):
+        raise AssertionError(f"dry run called {name}")
+
+
+def test_clean_bucket_dry_run_deletes_nothing(monkeypatch):
+    monkeypatch.setattr(clean, "s3", ListingS3(["a.mp4", "b.vtt"]))
+    result = clean.clean_bucket("bucket", dry_run=True)
+    assert (result["deleted"], result["would_delete"], result["failed"]) == (0, 2, 0)
@@ -0,0 +1,28 @@
+import io
+from transx import cues
+
+
+def test_parse_timestamp_reads_vtt_and_srt():
+    assert cues.parse_timestamp("00:01:02.500") == 62.5
+    assert cues.parse_timestamp("01:02.500") == 62.5
+    assert cues.parse_timestamp(" 01:00:01,250 ") == 3601.25
+
+
+def test_read_blocks_splits_headers_notes_and_cues():
+    text = "WEBVTT\r\n\r\nNOTE a note\r\n\r\n\r\nid\r\n00:01.000 --> 00:02.000 line:0\r\nfirst\r\nsecond\r\n\r\n00:03.000 --> 00:04.000\r\nlast"
+    header, note, cue, last = cues.read_blocks(io.StringIO(text, newline=""))
+    assert not header.is_cue and header.head_lines == ["WEBVTT"]
+    assert not note.is_cue and note.text == ""
+    assert (cue.start, cue.end) == (1.0, 2.0)
+    assert cue.head_lines == ["id", "00:01.000 --> 00:02.000 line:0"]
+    assert cue.text == "first\nsecond"
+    assert (last.start, last.end, last.text) == (3.0, 4.0, "last")
+    assert [block.start for block in cues.read_cues(io.StringIO(text, newline=""))] == [1.0, 3.0]
+
+
+def test_timings_in_notes_and_cue_text_are_not_cues():
+    text = "NOTE 00:01.000 --> 00:02.000\n\n00:03.000 --> 00:04.000\nfirst\n00:05.000 --> 00:06.000\n"
+    note, cue = cues.read_blocks(io.StringIO(text))
+    assert not note.is_cue
+    assert (cue.start, cue.end) == (3.0, 4.0)
+    assert cue.text == "first\n00:05.000 --> 00:06.000"
@@ -0,0 +1,49 @@
+import hashlib
+import random
+import pytest
+from transx import etags
+from transx.etags import DEFAULT_AWS_PART_SIZE, DEFAULT_S3CMD_PART_SIZE, WHOLE_FILE
+
+MB = 1024 * 1024
+PART_SIZES = [DEFAULT_AWS_PART_SIZE, DEFAULT_S3CMD_PART_SIZE, 5 * MB]
+
+
+def part_etag(input_file, part_size):
+    """The ETag as calc_etag computed it before, one part at a time."""
+    md5_digests = []
+    with open(input_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(part_size), b''):
+            md5_digests.append(hashlib.md5(chunk).digest())
+    return hashlib.md5(b''.join(md5_digests)).hexdigest() + '-' + str(len(md5_digests))
+
+
+@pytest.fixture(params=[0, 5 * MB, 8 * MB, 8 * MB + 1, 31 * MB], ids=lambda size: str(size))
+def data_file(request, tmp_path):
+    data_file = tmp_path / "data.bin"
+    data_file.write_bytes(random.Random(request.param).randbytes(request.param))
+    return data_file
+
+
+@pytest.mark.parametrize("buffer_size", [etags.READ_BUFFER_SIZE, 1000003])
+def test_calc_etags_matches_the_etag_of_each_part_size(data_file, buffer_size, monkeypatch):
+    # buffers of other sizes than the parts make the reads cross the part boundaries
+    monkeypatch.setattr(etags, "READ_BUFFER_SIZE", buffer_size)
+    result = etags.calc_etags(data_file, PART_SIZES + [WHOLE_FILE])
+    for part_size in PART_SIZES:
+        assert result[part_size] == part_etag(data_file, part_size)
+    assert result[WHOLE_FILE] == hashlib.md5(data_file.read_bytes()).hexdigest()
+
+
+def test_local_etags_hashes_once_per_file(tmp_path, monkeypatch):
+    data_file = tmp_path / "data.bin"
+    data_file.write_bytes(b"data" * 1000)
+    cache = etags.EtagCache(tmp_path / "etags.json")
+    calls = []
+    calc_etags = etags.calc_etags
+    monkeypatch.setattr(etags, "calc_etags", lambda *args: calls.append(args) or calc_etags(*args))
+    first = etags.local_etags(data_file, [WHOLE_FILE, DEFAULT_AWS_PART_SIZE], cache)
+    assert etags.local_etags(data_file, [DEFAULT_AWS_PART_SIZE, WHOLE_FILE], cache) == first
+    assert len(calls) == 1
+    data_file.write_bytes(b"changed")
+    assert etags.local_etags(data_file, [WHOLE_FILE], cache)[WHOLE_FILE] == hashlib.md5(b"changed").hexdigest()
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from transx import jobs
+from .fakes import FakeJobAdapter
+
+
+class FlakyJobAdapter(FakeJobAdapter):
+    """Fails the first describe calls, as a throttled or unreachable service would."""
+
+    def __init__(self, failures, error=None):
+        super().__init__()
+        self.failures = failures
+        self.error = error or ClientError({"Error": {"Code": "ThrottlingException"}}, "Describe")
+
+    def describe(self, job_id):
+        with self.lock:
+            failing = self.failures > 0
+            self.failures -= 1
+        if failing:
+            raise self.error
+        return super().describe(job_id)
+
+
+def test_wait_all_returns_done_jobs():
+    adapter = FakeJobAdapter()
+    adapter.submit("a", polls=1)
+    adapter.submit("b", polls=3)
+    done = jobs.wait_all(adapter, ["a", "b"])
+    assert done["a"]["Status"] == "COMPLETED"
+    assert done["b"]["Status"] == "COMPLETED"
+
+
+def test_wait_returns_failed_jobs():
+    adapter = FakeJobAdapter()
+    adapter.submit("a", polls=2, status="FAILED")
+    assert jobs.wait(adapter, "a")["Status"] == "FAILED"
+
+
+def test_wait_all_times_out():
+    adapter = FakeJobAdapter()
+    adapter.submit("slow", polls=10 ** 6)
+    adapter.submit("fast", polls=1)
+    done = jobs.wait_all(adapter, ["slow", "fast"], timeout=0.05)
+    assert done["slow"] is None
+    assert done["fast"]["Status"] == "COMPLETED"
+
+
+def test_describe_errors_are_retried_on_next_poll():
+    adapter = FlakyJobAdapter(failures=2)
+    adapter.submit("a", polls=1)
+    assert jobs.wait(adapter, "a")["Status"] == "COMPLETED"
+    assert adapter.failures < 0
+
+
+def test_poll_errors_do_not_stop_the_tracker():
+    adapter = FlakyJobAdapter(failures=1, error=RuntimeError("connection reset"))
+    adapter.submit("a", polls=1)
+    assert jobs.wait(adapter, "a")["Status"] == "COMPLETED"
+
+
+def test_tracker_loop_polls_jobs_of_many_threads_together():
+    adapter = FakeJobAdapter()
+    job_ids = [f"job-{i}" for i in range(8)]
+    for i, job_id in enumerate(job_ids):
+        adapter.submit(job_id, polls=i + 1)
+    with jobs.TrackerLoop() as tracker:
+        with ThreadPoolExecutor(max_workers=len(job_ids)) as executor:
+            done = list(executor.map(lambda job_id: tracker.wait(adapter, job_id), job_ids))
+        assert list(tracker.trackers) == [adapter.name]
+    assert [job["Status"] for job in done] == ["COMPLETED"] * len(job_ids)
+    assert not tracker.thread.is_alive()
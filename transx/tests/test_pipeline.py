@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+from transx import pipeline, transcribe, translate
+
+
+def test_jobs_of_medias_with_the_same_name_get_unique_names(tmp_path, monkeypatch):
+    items = []
+    for i, folder in enumerate(["a", "b"]):
+        media = tmp_path / folder / "intro.mp4"
+        transcript = media.parent / "subs" / "intro.en.vtt"
+        items.append({"file": media, "index": i, "status": "ok", "stages": {}, "transcripts": [transcript]})
+    names = []
+    monkeypatch.setattr(transcribe, "start_transcribe_job", lambda directory, media, bucket, name: names.append(name))
+    monkeypatch.setattr(translate, "start_translate_job", lambda prefix, bucket, name: names.append(name))
+    monkeypatch.setattr(pipeline, "s3", SimpleNamespace(upload_file=lambda **kwargs: None))
+    transcribe_func = pipeline.transcribe_stage(tmp_path, "bucket", None, "20260101000000")
+    translate_func = pipeline.translate_stage(tmp_path, "bucket", None, "20260101000000")
+    for item in items:
+        assert not transcribe_func(item)
+        assert not translate_func(item)
+    assert len(set(names)) == 4
@@ -0,0 +1,52 @@
+import random
+import pytest
+from transx import etags, sync
+from .fakes import FakeS3
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """The files hashed locally."""
+    hashed = []
+    calc_etags = etags.calc_etags
+    monkeypatch.setattr(etags, "calc_etags", lambda *args: hashed.append(args) or calc_etags(*args))
+    return hashed
+
+
+@pytest.mark.parametrize("size", [1000, 8 * MB + 1], ids=["single part", "multipart"])
+def test_uploaded_files_are_in_sync_without_hashing(media_dir, monkeypatch, hashed, size):
+    file_path = media_dir / "course" / "lesson.mp4"
+    file_path.parent.mkdir()
+    file_path.write_bytes(random.Random(size).randbytes(size))
+    monkeypatch.setattr(sync, "s3", FakeS3())
+    cache = etags.EtagCache(media_dir / "etags.json")
+    config = sync.transfer_config()
+    sync.sync_file("bucket", media_dir, file_path, config, cache=cache)
+    assert len(sync.s3.objects) == 1
+    key = sync.file_key(media_dir, file_path)
+    index = {key: sync.remote_object("bucket", key)}
+    assert sync.missing_part_sizes(file_path, key, index, cache) == []
+    assert sync.is_synced(file_path, "bucket", key, cache=cache)
+    assert not hashed
+    # the cached ETag is the one the file hashes to
+    part_size = sync.uploaded_part_size(size, config)
+    assert cache.get(file_path, part_size) == etags.calc_etag(file_path, part_size)
+
+
+def test_files_changed_while_uploading_are_not_cached(media_dir, monkeypatch):
+    file_path = media_dir / "lesson.mp4"
+    file_path.write_bytes(b"before")
+    s3 = FakeS3()
+    upload_file = s3.upload_file
+
+    def upload_and_change(**kwargs):
+        upload_file(**kwargs)
+        file_path.write_bytes(b"after!")
+
+    monkeypatch.setattr(s3, "upload_file", upload_and_change)
+    monkeypatch.setattr(sync, "s3", s3)
+    cache = etags.EtagCache(media_dir / "etags.json")
+    sync.sync_file("bucket", media_dir, file_path, cache=cache)
+    assert cache.get(file_path, etags.WHOLE_FILE) is None
@@ -0,0 +1,116 @@
+from transx import terms
+from transx.terms import TermMatcher
+
+
+def test_matcher_prefers_the_longest_term():
+    the_matcher = TermMatcher({"New York": "NY", "New York City": "NYC", "York": "Y"})
+    assert the_matcher.replace("New York City and New York and York") == ("NYC and NY and Y", 3)
+
+
+def test_matcher_replaces_in_one_pass():
+    # a replacement is not matched again by the other terms
+    the_matcher = TermMatcher({"a": "b", "b": "c"})
+    assert the_matcher.replace("ab") == ("bc", 2)
+
+
+def test_matcher_escapes_the_terms():
+    the_matcher = TermMatcher({"C++": "cpp", "a.b": "ab"})
+    assert the_matcher.replace("C++ and a.b, not axb") == ("cpp and ab, not axb", 2)
+
+
+def test_matcher_matches_inside_words_by_default():
+    the_matcher = TermMatcher({"cat": "dog"})
+    assert the_matcher.replace("cat category") == ("dog dogegory", 2)
+
+
+def test_matcher_matches_whole_words():
+    the_matcher = TermMatcher({"cat": "dog", "C++": "cpp"}, word_boundary=True)
+    assert the_matcher.replace("cat, category, bobcat, C++.") == ("dog, category, bobcat, cpp.", 2)
+
+
+def test_matcher_is_case_sensitive_by_default():
+    the_matcher = TermMatcher({"aws": "AWS"})
+    assert the_matcher.replace("aws Aws") == ("AWS Aws", 1)
+
+
+def test_matcher_ignores_case():
+    the_matcher = TermMatcher({"Amazon S3": "S3", "aws": "AWS"}, ignore_case=True)
+    assert the_matcher.replace("aws AWS amazon s3") == ("AWS AWS S3", 3)
+
+
+def test_matcher_without_terms_keeps_the_text():
+    assert TermMatcher({}).replace("text") == ("text", 0)
+
+
+VTT = """WEBVTT - transx 00:00
+
+NOTE cue 00:01.000 --> 00:02.000 is here
+
+intro
+00:00:01.000 --> 00:00:02.500 align:start position:10%
+the cue intro at 00:01
+
+00:02.500 --> 00:04.000
+WEBVTT NOTE intro
+-->
+"""
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+cue 1 at 00:01
+
+2
+00:00:02,500 --> 00:00:04,000
+two lines
+with 2 --> 1
+"""
+
+# terms that would break the headers, notes, ids and timings if replaced there
+BREAKING_TERMS = {"WEBVTT": "vtt", "NOTE": "nota", "intro": "INTRO", "00": "xx", ",": ";", ".": "!",
+                  "-->": "=>", "align": "ALIGN", "1": "one", "2": "two"}
+
+
+def fix_file(tmp_path, monkeypatch, name, text, in_place=False):
+    file_path = tmp_path / name
+    file_path.write_text(text)
+    out_path = file_path if in_place else tmp_path / ("fixed" + file_path.suffix)
+    monkeypatch.setattr(terms, "matcher", lambda lang_code: TermMatcher(BREAKING_TERMS))
+    terms.fix_terms(file_path, "en", out_path)
+    assert not list(tmp_path.glob("*.tmp"))
+    return out_path.read_text()
+
+
+def test_fix_terms_replaces_only_the_cue_text_of_vtt(tmp_path, monkeypatch):
+    assert fix_file(tmp_path, monkeypatch, "sub.vtt", VTT) == """WEBVTT - transx 00:00
+
+NOTE cue 00:01.000 --> 00:02.000 is here
+
+intro
+00:00:01.000 --> 00:00:02.500 align:start position:10%
+the cue INTRO at xx:0one
+
+00:02.500 --> 00:04.000
+vtt nota INTRO
+=>
+"""
+
+
+def test_fix_terms_replaces_only_the_cue_text_of_srt(tmp_path, monkeypatch):
+    assert fix_file(tmp_path, monkeypatch, "sub.srt", SRT) == """1
+00:00:01,000 --> 00:00:02,500
+cue one at xx:0one
+
+2
+00:00:02,500 --> 00:00:04,000
+two lines
+with two => one
+"""
+
+
+def test_fix_terms_rewrites_the_file_in_place(tmp_path, monkeypatch):
+    fixed = fix_file(tmp_path, monkeypatch, "sub.vtt", VTT, in_place=True)
+    assert fixed == fix_file(tmp_path, monkeypatch, "copy.vtt", VTT)
+
+
+def test_fix_terms_replaces_everywhere_in_other_files(tmp_path, monkeypatch):
+    assert fix_file(tmp_path, monkeypatch, "job.json", "intro, 2.") == "INTRO; two!"
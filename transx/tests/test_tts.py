@@ -0,0 +1,59 @@
+from transx import manifest, tts
+from .fakes import FakePolly, FakeS3
+
+VTT = """WEBVTT
+
+00:00:00.000 --> 00:00:02.000
+Hello <b>world</b> & friends.
+
+00:00:03.000 --> 00:00:04.000
+Bye.
+"""
+
+
+def write_vtt(media_dir, name):
+    subs_dir = media_dir / "course" / "subs"
+    subs_dir.mkdir(parents=True, exist_ok=True)
+    vtt_file = subs_dir / name
+    vtt_file.write_text(VTT)
+    return vtt_file
+
+
+def test_run_synthesizes_every_vtt(media_dir):
+    vtt_files = [write_vtt(media_dir, "lesson.en.vtt"), write_vtt(media_dir, "lesson.pt.vtt")]
+    s3 = FakeS3()
+    polly = FakePolly(s3, polls=2)
+    result = tts.run(media_dir, "bucket", poll_seconds=0, polly_client=polly, s3_client=s3)
+    assert result["started"] == 2
+    assert result["downloaded"] == 2
+    for vtt_file in vtt_files:
+        audio_file = vtt_file.with_suffix(".mp3")
+        assert result["files"][str(vtt_file.with_suffix(".ssml"))] == "completed"
+        assert "<speak" in audio_file.read_text()
+    voices = sorted(task["VoiceId"] for task in polly.tasks.values())
+    assert voices == ["Camila", "Joanna"]
+    recorded = manifest.read(media_dir)
+    assert set(recorded) >= {vtt_file.with_suffix(suffix) for vtt_file in vtt_files for suffix in [".ssml", ".mp3"]}
+
+
+def test_run_skips_languages_without_voice(media_dir):
+    vtt_file = write_vtt(media_dir, "lesson.xx.vtt")
+    s3 = FakeS3()
+    polly = FakePolly(s3)
+    result = tts.run(media_dir, "bucket", poll_seconds=0, polly_client=polly, s3_client=s3)
+    assert result["started"] == 0
+    assert result["files"] == {str(vtt_file.with_suffix(".ssml")): "not started"}
+    assert not polly.tasks
+
+
+def test_run_reports_failed_tasks(media_dir, monkeypatch):
+    vtt_file = write_vtt(media_dir, "lesson.en.vtt")
+    s3 = FakeS3()
+    polly = FakePolly(s3)
+    start = polly.start_speech_synthesis_task
+    # polly rejects the SSML once it reads it, as it does with unsupported tags
+    monkeypatch.setattr(polly, "start_speech_synthesis_task", lambda **kwargs: start(**kwargs | {"Text": "<speak>"}))
+    result = tts.run(media_dir, "bucket", poll_seconds=0, polly_client=polly, s3_client=s3)
+    assert result["files"] == {str(vtt_file.with_suffix(".ssml")): "failed"}
+    assert result["downloaded"] == 0
+    assert not vtt_file.with_suffix(".mp3").exists()
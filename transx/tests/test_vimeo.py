@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from transx import etags, vimeo
+
+
+def make_response(status_code, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    return response
+
+
+def write_video(media_dir, name, data, subs=()):
+    video = media_dir / name
+    video.parent.mkdir(parents=True, exist_ok=True)
+    video.write_bytes(data)
+    for lang_code in subs:
+        subs_dir = video.parent / "subs"
+        subs_dir.mkdir(exist_ok=True)
+        (subs_dir / f"{video.stem}.{lang_code}.vtt").write_text(f"WEBVTT\n\n00:00.000 --> 00:01.000\n{lang_code}\n")
+    return video
+
+
+def tracks_by_lang(server, video_uri):
+    return {track["language"]: track for track in server.tracks[vimeo.video_id(video_uri)]}
+
+
+def test_rate_limiter_backs_off_until_retry_after_429():
+    limiter = vimeo.RateLimiter(rate=1000, burst=10, reserve=0)
+    limiter.observe(make_response(429, **{"Retry-After": "0.2"}))
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert limiter.waits >= 1
+
+
+def test_rate_limiter_waits_for_reset_at_reserve():
+    limiter = vimeo.RateLimiter(rate=1000, burst=10, reserve=2)
+    reset = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(time.time() + 1))
+    limiter.observe(make_response(200, **{"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": reset}))
+    limiter.acquire()
+    assert limiter.waits == 0
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started > 0
+    assert limiter.waits >= 1
+
+
+def test_api_retries_after_429(vimeo_server):
+    vimeo_server.window = 0.5
+    while not vimeo_server.spend()[1]:
+        pass
+    vimeo_server.reset_at = time.time() + vimeo_server.window
+    response = vimeo.api("get", f"/users/{vimeo_server.user_id}/projects")
+    assert response.status_code == 200
+    assert vimeo_server.throttled == 2
+    assert vimeo.rate_limiter().waits >= 1
+
+
+def test_upload_links_skip_the_rate_limit(vimeo_server):
+    vimeo.api("put", f"{vimeo_server.upload_url}/texttrack-upload/videos/1/texttracks/1", data=b"WEBVTT")
+    assert vimeo.rate_limiter().remaining is None
+
+
+def test_run_uploads_videos_and_subs(media_dir, vimeo_server):
+    video = write_video(media_dir, "course/lesson.mp4", b"video" * 100, subs=["en", "pt-BR"])
+    assert vimeo.run(media_dir) == {str(video): "DONE"}
+    upload, = vimeo_server.uploads.values()
+    assert bytes(upload["data"]) == video.read_bytes()
+    tracks = tracks_by_lang(vimeo_server, "/videos/1")
+    assert sorted(tracks) == ["en", "pt-BR"]
+    assert all(track["active"] for track in tracks.values())
+    assert vimeo_server.track_files[tracks["en"]["uri"]] == (video.parent / "subs/lesson.en.vtt").read_bytes()
+
+
+def test_run_resumes_failed_upload(media_dir, vimeo_server, settings, monkeypatch):
+    settings(VIMEO_CHUNK_SIZE=100)
+    tus_uploader = vimeo.tus_uploader
+
+    def uploader_without_retries(fs, link):
+        # the failed chunk is not retried within the upload, the next run resumes it
+        uploader = tus_uploader(fs, link)
+        uploader.retries = 0
+        return uploader
+
+    monkeypatch.setattr(vimeo, "tus_uploader", uploader_without_retries)
+    video = write_video(media_dir, "course/lesson.mp4", bytes(range(256)) * 2)
+    vimeo_server.fail_at = 250
+    assert vimeo.run(media_dir) == {str(video): "ERROR"}
+    pending = vimeo.upload_journal(video).get(video)
+    assert pending["offset"] == 200
+    assert vimeo.run(media_dir) == {str(video): "DONE"}
+    upload, = vimeo_server.uploads.values()
+    assert bytes(upload["data"]) == video.read_bytes()
+    # the chunks acknowledged before the failure are not sent again
+    assert vimeo_server.tus_bytes == video.stat().st_size + 100
+    assert vimeo.upload_journal(video).get(video) is None
+
+
+def test_run_uploads_identical_files_once(media_dir, vimeo_server, monkeypatch):
+    vimeo_server.tus_delay = 0.1
+    data = b"same" * 100
+    videos = [write_video(media_dir, "a/lesson.mp4", data), write_video(media_dir, "b/copy.mp4", data),
+              write_video(media_dir, "a/other.mp4", b"other" * 100)]
+    assert vimeo.run(media_dir, jobs=3) == {str(video): "DONE" for video in videos}
+    assert len(vimeo_server.uploads) == 2
+    hashed = []
+    calc_etags = etags.calc_etags
+    monkeypatch.setattr(etags, "calc_etags", lambda *args: hashed.append(args) or calc_etags(*args))
+    videos[1].rename(media_dir / "a" / "renamed.mp4")
+    requests_before = len(vimeo_server.requests)
+    vimeo.run(media_dir, jobs=3)
+    assert len(vimeo_server.uploads) == 2
+    # only the renamed file is hashed, and no video is looked up by name
+    assert len(hashed) == 1
+    assert not [path for _, path in vimeo_server.requests[requests_before:] if path.endswith("/items")]
+
+
+def test_run_keeps_one_state_for_a_fresh_tree(tmp_path, vimeo_server):
+    video = write_video(tmp_path, "a/lesson.mp4", b"video" * 100)
+    vimeo.run(tmp_path)
+    moved = tmp_path / "b" / "lesson.mp4"
+    moved.parent.mkdir()
+    video.rename(moved)
+    assert vimeo.run(tmp_path) == {str(moved): "DONE"}
+    assert len(vimeo_server.uploads) == 1
+    assert (tmp_path / ".transx" / "vimeo_videos.json").is_file()
+    assert not (tmp_path / "a" / ".transx").exists()
+
+
+def test_run_publishes_changed_subs_only(media_dir, vimeo_server):
+    video = write_video(media_dir, "course/lesson.mp4", b"video" * 100, subs=["en", "es"])
+    vimeo.run(media_dir)
+    old_tracks = tracks_by_lang(vimeo_server, "/videos/1")
+    requests_before = len(vimeo_server.requests)
+    vimeo.run(media_dir)
+    assert not [path for method, path in vimeo_server.requests[requests_before:]
+                if "texttrack" in path and method != "GET"]
+    es_sub = video.parent / "subs/lesson.es.vtt"
+    es_sub.write_text(es_sub.read_text() + "\n00:01.000 --> 00:02.000\nmas\n")
+    vimeo.run(media_dir)
+    new_tracks = tracks_by_lang(vimeo_server, "/videos/1")
+    assert new_tracks["en"] == old_tracks["en"]
+    assert new_tracks["es"]["uri"] != old_tracks["es"]["uri"]
+    assert vimeo_server.track_files[new_tracks["es"]["uri"]] == es_sub.read_bytes()
+    assert len(vimeo_server.tracks["1"]) == 2
+
+
+def test_state_lists_each_key_once_without_blocking_the_others(monkeypatch):
+    listing = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_get_all(request_url):
+        calls.append(request_url)
+        if request_url.endswith("/projects"):
+            # a listing waiting for the rate limit to reset
+            listing.set()
+            release.wait(5)
+            return [{"name": "course", "uri": "/projects/1"}]
+        return [{"type": "video", "video": {"name": "lesson.mp4", "uri": "/videos/1"}}]
+
+    monkeypatch.setattr(vimeo, "get_all", slow_get_all)
+    monkeypatch.setattr(vimeo, "vimeo_user_id", lambda: "1")
+    state = vimeo.VimeoState()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        folders = [executor.submit(state.folder, "course") for _ in range(2)]
+        assert listing.wait(5)
+        # other keys are looked up while the projects are listed
+        video = executor.submit(state.video, "/projects/2", "lesson.mp4")
+        assert video.result(timeout=1) == {"name": "lesson.mp4", "uri": "/videos/1"}
+        release.set()
+        assert [future.result()["uri"] for future in folders] == ["/projects/1"] * 2
+    assert calls.count("/users/1/projects") == 1
+    assert state.video("/projects/2", "lesson.mp4")["uri"] == "/videos/1"
+    assert calls.count("/projects/2/items") == 1
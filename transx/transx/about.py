@@ -1,10 +1,13 @@
-import click
-from . import utils
 from . import cmd
-from .logs import *
+
+semver = "0.0.1"
+
+
+def version():
+    return semver
+
 
 @cmd.cli.command('version')
 def command():
     """Prints the version of transx."""
-    info(utils.version())
-
+    print(version())
@@ -0,0 +1,54 @@
+import threading
+from .config import Config
+
+_session = None
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def client_config():
+    """Connection pool, keep-alive and retry settings shared by all the clients."""
+    # botocore takes a while to import, so commands that never call AWS skip it
+    from botocore.config import Config as BotoConfig
+    return BotoConfig(
+        max_pool_connections=Config.AWS_MAX_POOL_CONNECTIONS.resolve(),
+        tcp_keepalive=Config.AWS_TCP_KEEPALIVE.resolve() == "on",
+        retries={
+            'mode': Config.AWS_RETRY_MODE.resolve(),
+            'max_attempts': Config.AWS_MAX_ATTEMPTS.resolve(),
+        })
+
+
+def session():
+    """The boto3 session all the clients are created from."""
+    global _session
+    with _clients_lock:
+        if not _session:
+            import boto3
+            _session = boto3.session.Session()
+    return _session
+
+
+def client(service_name):
+    """The client of the service, created on first use and shared by all threads afterwards."""
+    result = _clients.get(service_name)
+    if result:
+        return result
+    the_session = session()
+    with _clients_lock:
+        result = _clients.get(service_name)
+        if not result:
+            # sessions are not thread safe, clients are
+            result = the_session.client(service_name, config=client_config())
+            _clients[service_name] = result
+    return result
+
+
+class LazyClient:
+    """Stands in for a boto3 client at import time, creating it when first used."""
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, name):
+        return getattr(client(self.service_name), name)
@@ -1,64 +1,153 @@
 import click
-from . import cmd
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from . import cmd, manifest
 from .logs import *
 from .utils import *
 from .files import *
 
 
-def clean_directory(directory):
-    # delete all media, subtitles, transcriptions, translations
-    files = find_all(directory)
-    for file_path in files:
-        is_output = is_output(file_path)
-        if is_output:
+def delete_files(file_paths, dry_run=False):
+    """Deletes the files, returning the ones that are left and the bytes freed."""
+    left = []
+    freed = 0
+    for file_path in file_paths:
+        try:
+            size = file_path.stat().st_size
             debug(f"Deleting {file_path}")
-            file_path.unlink()
-    info("Cleaned up directory.")
-
-
-def clean_bucket(bucket_name):
-    # List all objects in the bucket
-    objects = s3.list_objects_v2(Bucket=bucket_name)
-
-    # Delete all objects and object versions
-    if 'Contents' in objects:
-        for obj in objects['Contents']:
-            s3.delete_object(Bucket=bucket_name, Key=obj['Key'])
-
-    # List all object versions in the bucket
-    object_versions = s3.list_object_versions(Bucket=bucket_name)
-
-    # Delete all object versions
-    if 'Versions' in object_versions:
-        for version in object_versions['Versions']:
-            s3.delete_object(Bucket=bucket_name, Key=version['Key'], VersionId=version['VersionId'])
-
-    # Delete all delete markers (if any)
-    if 'DeleteMarkers' in object_versions:
-        for delete_marker in object_versions['DeleteMarkers']:
-            s3.delete_object(Bucket=bucket_name, Key=delete_marker['Key'], VersionId=delete_marker['VersionId'])
-
-    # Delete bucket policies
-    s3.delete_bucket_policy(Bucket=bucket_name)
-
-    # Delete bucket
+            if dry_run:
+                left.append(file_path)
+            else:
+                file_path.unlink()
+            freed += size
+        except FileNotFoundError:
+            debug(f"Already deleted {file_path}")
+        except OSError as e:
+            error(f"Failed to delete {file_path}: {e}")
+            left.append(file_path)
+    return left, freed
+
+
+def clean_directory(directory, file_index=None, dry_run=False):
+    """Deletes the files transx generated, from the manifests or else from an index of the directory."""
+    directory = Path(directory).resolve()
+    roots = [] if file_index else manifest.find_manifests(directory)
+    recorded = {root: manifest.read(root) for root in roots}
+    # manifests above the directory also list files outside of it
+    outputs = list(dict.fromkeys(file_path for file_paths in recorded.values() for file_path in file_paths
+                                 if directory in file_path.parents))
+    if not roots:
+        debug(f"No manifest in {directory}, looking for outputs in the whole directory.")
+        outputs = index_files(file_index or directory).outputs
+    left, freed = delete_files(outputs, dry_run)
+    if dry_run:
+        info(f"Would clean up {len(left)} files from directory, freeing {freed / 1024 / 1024:.1f} MB.")
+        return freed
+    deleted = set(outputs) - set(left)
+    for root, file_paths in recorded.items():
+        manifest.write(root, [file_path for file_path in file_paths if file_path not in deleted])
+    info(f"Cleaned up {len(deleted)} files from directory, freeing {freed / 1024 / 1024:.1f} MB.")
+    return freed
+
+
+# delete_objects takes at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def is_versioned(bucket_name):
+    # suspended buckets still keep the versions written before
+    return s3.get_bucket_versioning(Bucket=bucket_name).get('Status') in ('Enabled', 'Suspended')
+
+
+def list_batches(bucket_name, prefix=""):
+    """Yields the versions and delete markers, or the keys of an unversioned bucket, in batches of up to 1000."""
+    if not is_versioned(bucket_name):
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={'PageSize': DELETE_BATCH_SIZE}):
+            batch = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+            if batch:
+                yield batch
+        return
+    # deleting a version by id is permanent, it adds no delete marker to list
+    paginator = s3.get_paginator('list_object_versions')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig={'PageSize': DELETE_BATCH_SIZE}):
+        versions = page.get('Versions', []) + page.get('DeleteMarkers', [])
+        batch = [{'Key': version['Key'], 'VersionId': version['VersionId']} for version in versions]
+        for i in range(0, len(batch), DELETE_BATCH_SIZE):
+            yield batch[i:i + DELETE_BATCH_SIZE]
+
+
+def delete_batch(bucket_name, batch):
+    """Deletes up to 1000 keys in one request, returning the number of keys that failed."""
+    response = s3.delete_objects(Bucket=bucket_name, Delete={'Objects': batch, 'Quiet': True})
+    errors = response.get('Errors', [])
+    for e in errors:
+        error(f"Failed to delete s3://{bucket_name}/{e['Key']}: {e.get('Code')} {e.get('Message')}")
+    debug(f"Deleted {len(batch) - len(errors)} keys from {bucket_name}")
+    return len(errors)
+
+
+def delete_keys(bucket_name, prefix, jobs, dry_run):
+    listed = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for batch in list_batches(bucket_name, prefix):
+            listed += len(batch)
+            if dry_run:
+                for key in batch:
+                    debug(f"Would delete s3://{bucket_name}/{key['Key']} {key.get('VersionId', '')}")
+            else:
+                futures.append(executor.submit(delete_batch, bucket_name, batch))
+        for future in futures:
+            failed += future.result()
+    return listed, failed
+
+
+def clean_bucket(bucket_name, prefix=None, jobs=None, dry_run=False):
+    """Deletes every object, version and delete marker under the prefix, and the bucket itself when no prefix is given."""
+    prefix = prefix or ""
+    jobs = resolve(Config.CLEAN_JOBS, jobs)
+    result = {"bucket": bucket_name, "prefix": prefix, "dry_run": dry_run, "deleted": 0, "would_delete": 0, "failed": 0}
+    try:
+        listed, failed = delete_keys(bucket_name, prefix, jobs, dry_run)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchBucket':
+            warning(f"Bucket '{bucket_name}' does not exist, nothing to clean.")
+            return result
+        raise
+    if dry_run:
+        result["would_delete"] = listed
+        info(f"Would delete {listed} keys from bucket '{bucket_name}' under '{prefix}'.")
+        return result
+    result["deleted"] = listed - failed
+    result["failed"] = failed
+    if prefix or failed:
+        info(f"Deleted {listed - failed} keys from bucket '{bucket_name}' under '{prefix}', {failed} failed.")
+        return result
+    try:
+        s3.delete_bucket_policy(Bucket=bucket_name)
+    except ClientError as e:
+        warning(f"Could not delete the policy of bucket '{bucket_name}': {e}")
     s3.delete_bucket(Bucket=bucket_name)
+    info(f"All {listed} keys in bucket '{bucket_name}' have been deleted, and the bucket too.")
+    return result
 
-    print(f"All contents in bucket '{bucket_name}' have been deleted.")
 
-
-def clean (directory, bucket_name):
+def clean(directory, bucket_name, prefix=None, jobs=None, dry_run=False):
     """Clean up the local and remote directories."""
     debug("Cleaning up directories.")
-    clean_directory(directory)
-    clean_bucket(bucket_name)
+    freed = clean_directory(directory, dry_run=dry_run)
+    return clean_bucket(bucket_name, prefix, jobs, dry_run) | {"freed_bytes": freed}
 
 
 @cmd.cli.command('clean')
 @click.option('--directory', default=None, help='Directory to search in')
 @click.option('--bucket_name', default=None, help='Bucket name')
-def command(directory, bucket_name):
-    directory = resolve(Config.TRANSX_PATH, directory)
-    bucket_name = resolve(Config.TRANSX_BUCKET_NAME, bucket_name)
-    click.echo(clean(directory, bucket_name))
-
+@click.option('--prefix', default=None, help='Only delete the keys under this prefix, keeping the bucket')
+@click.option('--jobs', default=None, type=int, help='Number of delete requests to send concurrently')
+@click.option('--dry_run', is_flag=True, default=False, help='List what would be deleted without deleting it')
+def command(directory, bucket_name, prefix, jobs, dry_run):
+    directory = resolve(Config.MEDIA_PATH, directory)
+    bucket_name = resolve(Config.BUCKET_NAME, bucket_name)
+    info(clean(directory, bucket_name, prefix, jobs, dry_run))
@@ -1,8 +1,30 @@
 import click
+import importlib
 from .logs import debug
 
 
-@click.group()
+class LazyGroup(click.Group):
+    """Group that imports the module of a subcommand only when the subcommand is used."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = {}
+
+    def add_lazy_command(self, name, module_name):
+        self.lazy_commands[name] = module_name
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        module_name = self.lazy_commands.get(cmd_name)
+        if module_name and cmd_name not in self.commands:
+            # the module registers its command in this group when imported
+            importlib.import_module(module_name, __package__)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup)
 @click.option('--force/--no-force', default=False)
 def cli(force):
     debug(f"Force mode is {'on' if force else 'off'}")
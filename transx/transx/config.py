@@ -3,8 +3,7 @@ from datetime import datetime
 from enum import Enum, auto
 from dynaconf import Dynaconf
 from .logs import *
-from . import terms_static
-from . import cmd, terms
+from . import cmd
 from pathlib import Path
 
 _HERE = os.path.dirname(os.path.abspath(__file__))
@@ -29,39 +28,112 @@ _now = datetime.now()
 _now_str = _now.strftime('%Y%m%d_%H%M%S')
 _today_str = _now.strftime('%Y%m%d')
 
+# defaults of the settings, kept out of the members so equal defaults never alias each other
+_DEFAULTS = {
+    "MEDIA_PATH": os.getcwd(),
+    "BUCKET_NAME": f'transx.s3.{_today_str}',
+    "ROLE_NAME": f"transx.role.{_today_str}",
+    "SOURCE_LANG": "en",
+    "TARGET_LANG": "pt,es,ca",
+    "TEST_DESCRIPTION": "default description",
+    "VIMEO_AUTH_URL": 'https://api.vimeo.com/oauth/authorize',
+    "VIMEO_TOKEN_URL": 'https://api.vimeo.com/oauth/access_token',
+    "SYNC_JOBS": 8,
+    "TRANSFER_MAX_CONCURRENCY": 10,
+    "TRANSFER_CHUNK_SIZE": 8388608,
+    "STATE_DIR": ".transx",
+    "HASH_JOBS": 0,
+    "PIPELINE_JOBS": 5,
+    "PIPELINE_QUEUE_SIZE": 16,
+    "TRANSCRIBE_MAX_JOBS": 20,
+    "TRANSCRIBE_POLL_SECONDS": 30,
+    "DOWNLOAD_JOBS": 12,
+    "TERMS_MATCH": "substring",
+    "TERMS_CASE": "sensitive",
+    "AWS_MAX_POOL_CONNECTIONS": 100,
+    "AWS_TCP_KEEPALIVE": "on",
+    "AWS_RETRY_MODE": "adaptive",
+    "AWS_MAX_ATTEMPTS": 6,
+    "CLEAN_JOBS": 32,
+    "SSML_JOBS": 0,
+    "SSML_TOLERANCE_MS": 250,
+    "SSML_MAX_RATE": 150,
+    "TTS_ENGINE": "neural",
+    "TTS_FORMAT": "mp3",
+    "TTS_JOBS": 10,
+    "VIMEO_API_URL": 'https://api.vimeo.com',
+    "VIMEO_JOBS": 4,
+    "VIMEO_RATE": 2.0,
+    "VIMEO_BURST": 8,
+    "VIMEO_RATE_RESERVE": 5,
+    "VIMEO_CHUNK_SIZE": 134217728,
+}
+
+
 class Config(Enum):
 
-    MEDIA_PATH = os.getcwd()
-    BUCKET_NAME = f'transx.s3.{_today_str}'
-    ROLE_NAME = f"transx.role.{_today_str}"
-    SOURCE_LANG = "en"
-    TARGET_LANG = "pt,es,ca"
-    TEST_DESCRIPTION = "default description"
+    def _generate_next_value_(name, start, count, last_values):
+        return name
+
+    MEDIA_PATH = auto()
+    BUCKET_NAME = auto()
+    ROLE_NAME = auto()
+    SOURCE_LANG = auto()
+    TARGET_LANG = auto()
+    TEST_DESCRIPTION = auto()
     VIMEO_CLIENT_ID = auto()
     VIMEO_ACCESS_TOKEN = auto()
     VIMEO_CLIENT_SECRET = auto()
     VIMEO_USER_ID = auto()
-    VIMEO_AUTH_URL = 'https://api.vimeo.com/oauth/authorize'
-    VIMEO_TOKEN_URL = 'https://api.vimeo.com/oauth/access_token'
+    VIMEO_AUTH_URL = auto()
+    VIMEO_TOKEN_URL = auto()
+    SYNC_JOBS = auto()
+    TRANSFER_MAX_CONCURRENCY = auto()
+    TRANSFER_CHUNK_SIZE = auto()
+    STATE_DIR = auto()
+    HASH_JOBS = auto()
+    PIPELINE_JOBS = auto()
+    PIPELINE_QUEUE_SIZE = auto()
+    TRANSCRIBE_MAX_JOBS = auto()
+    TRANSCRIBE_POLL_SECONDS = auto()
+    DOWNLOAD_JOBS = auto()
+    TERMS_MATCH = auto()
+    TERMS_CASE = auto()
+    AWS_MAX_POOL_CONNECTIONS = auto()
+    AWS_TCP_KEEPALIVE = auto()
+    AWS_RETRY_MODE = auto()
+    AWS_MAX_ATTEMPTS = auto()
+    CLEAN_JOBS = auto()
+    SSML_JOBS = auto()
+    SSML_TOLERANCE_MS = auto()
+    SSML_MAX_RATE = auto()
+    TTS_ENGINE = auto()
+    TTS_FORMAT = auto()
+    TTS_JOBS = auto()
+    VIMEO_API_URL = auto()
+    VIMEO_JOBS = auto()
+    VIMEO_RATE = auto()
+    VIMEO_BURST = auto()
+    VIMEO_RATE_RESERVE = auto()
+    VIMEO_CHUNK_SIZE = auto()
 
     def resolve(self, prompt_val=None):
         if prompt_val:
             return prompt_val
         val = settings.get(self.name)
+        default = _DEFAULTS.get(self.name)
         if not val:
-            default = self.value
             val = default() if callable(default) else default
+        elif isinstance(default, (int, float)) and isinstance(val, str):
+            # quoted in a settings file, still a number
+            val = type(default)(val)
         return val
 
     @staticmethod
     def terms(lang_code=None):
-        if not lang_code:
-            lang_code = "__all__"
-        static_ts = terms_static.default_terms.get(lang_code,{})
-        cfg_tts = settings.get("terms", {})
-        cfg_ts = cfg_tts.get(lang_code)
-        result = static_ts | cfg_ts
-        return result
+        # imported here, the terms module depends on this one
+        from . import terms
+        return terms.registry.get(lang_code).terms
 
 
 @cmd.cli.command("config")
@@ -0,0 +1,76 @@
+"""Streaming reader of VTT and SRT subtitle files."""
+
+SUBTITLE_SUFFIXES = ['.vtt', '.srt']
+
+TIMING_SEPARATOR = "-->"
+
+# blocks of a VTT file that are never cues, even when their text has a timing
+VTT_BLOCK_KEYWORDS = ("WEBVTT", "NOTE", "STYLE", "REGION")
+
+
+def parse_timestamp(value):
+    """Seconds of a VTT (00:01:02.500 or 01:02.500) or SRT (00:01:02,500) timestamp."""
+    parts = value.strip().replace(",", ".").split(":")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class Block:
+    """A blank line separated block of a subtitle file: a header, a note or a cue."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.text_start = len(lines)
+        self.start = None
+        self.end = None
+        if lines[0].split(maxsplit=1)[0] in VTT_BLOCK_KEYWORDS:
+            return
+        # the timing line comes first, or after the cue id
+        for i, line in enumerate(lines[:2]):
+            if TIMING_SEPARATOR in line:
+                start, end = line.split(TIMING_SEPARATOR, 1)
+                self.start = parse_timestamp(start)
+                # the end time may be followed by cue settings
+                self.end = parse_timestamp(end.split()[0])
+                self.text_start = i + 1
+                break
+
+    @property
+    def is_cue(self):
+        return self.start is not None
+
+    @property
+    def head_lines(self):
+        """The id and timing lines of a cue, or all the lines of any other block."""
+        return self.lines[:self.text_start]
+
+    @property
+    def text(self):
+        return "\n".join(self.lines[self.text_start:])
+
+
+def read_blocks(fp):
+    """Lazily yields the blocks of an open subtitle file."""
+    lines = []
+    for line in fp:
+        line = line.rstrip("\r\n")
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield Block(lines)
+            lines = []
+    if lines:
+        yield Block(lines)
+
+
+def read_cues(fp):
+    """Lazily yields the cues of an open subtitle file, skipping headers and notes."""
+    return (block for block in read_blocks(fp) if block.is_cue)
+
+
+def write_block(fp, lines, first=False):
+    if not first:
+        fp.write("\n")
+    fp.write("\n".join(lines) + "\n")
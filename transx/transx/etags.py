@@ -0,0 +1,129 @@
+import hashlib
+from .logs import *
+from .store import FileStore, shared_store
+
+DEFAULT_S3CMD_PART_SIZE = 15728640
+
+DEFAULT_AWS_PART_SIZE = 8388608
+
+# Part size used for the plain md5 of objects uploaded in a single part
+WHOLE_FILE = 0
+
+READ_BUFFER_SIZE = 8388608
+
+
+class _PartChain:
+    """Running md5 chain of one part size, fed with consecutive chunks of a file."""
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.md5_digests = []
+        self.md5 = hashlib.md5()
+        self.filled = 0
+
+    def update(self, data):
+        if not self.part_size:
+            self.md5.update(data)
+            return
+        offset = 0
+        while offset < len(data):
+            take = min(self.part_size - self.filled, len(data) - offset)
+            self.md5.update(data[offset:offset + take])
+            offset += take
+            self.filled += take
+            if self.filled == self.part_size:
+                self.md5_digests.append(self.md5.digest())
+                self.md5 = hashlib.md5()
+                self.filled = 0
+
+    def etag(self):
+        if not self.part_size:
+            return self.md5.hexdigest()
+        md5_digests = self.md5_digests
+        if self.filled:
+            md5_digests = md5_digests + [self.md5.digest()]
+        return hashlib.md5(b''.join(md5_digests)).hexdigest() + '-' + str(len(md5_digests))
+
+
+def calc_etags(input_file, part_sizes):
+    """Computes the ETag of the file for every part size, reading it only once."""
+    chains = [_PartChain(part_size) for part_size in set(part_sizes)]
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(input_file, 'rb', buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            for chain in chains:
+                chain.update(view[:read])
+    return {chain.part_size: chain.etag() for chain in chains}
+
+
+def calc_etag(input_file, part_size):
+    return calc_etags(input_file, [part_size])[part_size]
+
+
+def factor_of_1mb(filesize, num_parts):
+    x = filesize / int(num_parts)
+    y = x % 1048576
+    return int(x + 1048576 - y)
+
+
+def possible_part_sizes(filesize, num_parts):
+    return lambda part_size: part_size < filesize and (float(filesize) / float(part_size)) <= num_parts
+
+
+def candidate_part_sizes(s3_etag, filesize):
+    """Part sizes that may have produced the S3 ETag for a file of this size."""
+    etag_arr = s3_etag.split('-')
+    if len(etag_arr) == 1:
+        return [WHOLE_FILE]
+    if len(etag_arr) == 2:
+        num_parts = int(etag_arr[1])
+        default_part_sizes = [
+            DEFAULT_AWS_PART_SIZE,
+            DEFAULT_S3CMD_PART_SIZE,
+            factor_of_1mb(filesize, num_parts)
+        ]
+        return list(filter(possible_part_sizes(filesize, num_parts), default_part_sizes))
+    return []
+
+
+class EtagCache(FileStore):
+    """Persistent cache of local ETags, keyed by file path, size, mtime and part size."""
+
+    name = "etag cache"
+    # saved once at the end of a run, not on every hash
+    autosave = False
+
+    def get(self, file_path, part_size):
+        entry = super().get(file_path)
+        return entry.get('etags', {}).get(str(part_size)) if entry else None
+
+    def put(self, file_path, part_size, etag):
+        with self.lock:
+            self._current(file_path).setdefault('etags', {})[str(part_size)] = etag
+            self._changed()
+
+
+def etag_cache(cache_file):
+    """The cache of the file, shared by everything hashing files of the same media directory."""
+    return shared_store(cache_file, EtagCache)
+
+
+def local_etags(file_path, part_sizes, cache=None):
+    """ETags of the local file for each part size, hashing the file at most once."""
+    etags = {}
+    for part_size in part_sizes:
+        etag = cache.get(file_path, part_size) if cache else None
+        if etag:
+            etags[part_size] = etag
+    missing = [part_size for part_size in part_sizes if part_size not in etags]
+    if missing:
+        debug(f"Calculating etags of {file_path} for part sizes {missing}")
+        for part_size, etag in calc_etags(file_path, missing).items():
+            etags[part_size] = etag
+            if cache:
+                cache.put(file_path, part_size, etag)
+    return etags
@@ -5,28 +5,91 @@ from .config import Config
 from .utils import  *
 from .utils import  *
 
+MEDIA_SUFFIXES = ['.mp4']
+
+OUTPUT_DIRS = ['subs', 'subtitles']
+
+
+def is_output(file_path, directory):
+    """Check if the file was generated by transx (transcriptions, downloaded subtitles, ssml)."""
+    if file_path.suffix in MEDIA_SUFFIXES:
+        return False
+    # only the dirs under the indexed directory, its own path may have any names
+    parts = file_path.relative_to(directory).parent.parts
+    return (any(part in OUTPUT_DIRS for part in parts)
+            or ".transcribe." in file_path.name
+            or file_path.suffix == ".ssml")
+
+
+def walk(directory):
+    """Lazily yields every file under the directory, in a single os.scandir walk."""
+    state_dir = Config.STATE_DIR.resolve()
+    dirs = [directory]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != state_dir:
+                        dirs.append(entry.path)
+                elif entry.is_file():
+                    yield Path(entry.path)
+
+
+class FileIndex:
+    """Files under a media directory, classified by suffix in one walk."""
+
+    def __init__(self, directory):
+        self.directory = Config.MEDIA_PATH.resolve(directory)
+        self.medias = []
+        self.srts = []
+        self.vtts = []
+        self.outputs = []
+        for file_path in walk(self.directory):
+            suffix = file_path.suffix
+            if suffix in MEDIA_SUFFIXES:
+                self.medias.append(file_path)
+            elif suffix == ".srt":
+                self.srts.append(file_path)
+            elif suffix == ".vtt":
+                self.vtts.append(file_path)
+            if is_output(file_path, self.directory):
+                self.outputs.append(file_path)
+        debug(f"Indexed [{len(self.medias)}] medias, [{len(self.srts) + len(self.vtts)}] subtitles "
+              f"and [{len(self.outputs)}] outputs in [{self.directory}]")
+
+    @property
+    def subtitles(self):
+        return self.srts + self.vtts
+
+    @property
+    def all(self):
+        return self.medias + self.subtitles
+
+
+def index_files(directory):
+    if isinstance(directory, FileIndex):
+        return directory
+    return FileIndex(directory)
+
 
 def find_videos(directory):
-    return find_glob(directory, "*.mp4")
+    return index_files(directory).medias
 
 
 def find_medias(directory):
-    return find_glob(directory, "*.mp4")
+    return index_files(directory).medias
 
 
 def find_subtitles(directory):
-    srts = find_srt(directory)
-    vtts = find_vtt(directory)
-    subs = srts + vtts
-    return subs
+    return index_files(directory).subtitles
 
 
 def find_vtt(directory):
-    return find_glob(directory, "*.vtt")
+    return index_files(directory).vtts
 
 
 def find_srt(directory):
-    return find_glob(directory, "*.srt")
+    return index_files(directory).srts
 
 
 def find_glob(directory, glob_pattern):
@@ -39,7 +102,4 @@ def find_glob(directory, glob_pattern):
 
 
 def find_all(directory):
-    videos = find_medias(directory)
-    subs = find_subtitles(directory)
-    result = videos + subs
-    return result
+    return index_files(directory).all
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+from botocore.exceptions import ClientError
+from .logs import *
+
+
+class JobAdapter:
+    """Reads the status of the jobs of one service."""
+
+    name = "job"
+    status_key = "Status"
+    done_status = ["COMPLETED", "FAILED"]
+    min_interval = 30
+    max_interval = 2 * 60
+    timeout = 60 * 60
+
+    def describe(self, job_id):
+        raise NotImplementedError
+
+    def is_done(self, job):
+        return job.get(self.status_key) in self.done_status
+
+    async def poll(self, job_ids):
+        """Describes the jobs concurrently, returning the ones that are done."""
+        jobs = await asyncio.gather(*(asyncio.to_thread(self._describe, job_id) for job_id in job_ids))
+        return {job_id: job for job_id, job in zip(job_ids, jobs) if job and self.is_done(job)}
+
+    def _describe(self, job_id):
+        try:
+            job = self.describe(job_id)
+            debug(f"Current status of {self.name} job {job_id}: {job.get(self.status_key)}")
+            return job
+        except ClientError as e:
+            error(f"Error fetching {self.name} job status for {job_id}: {e}")
+            return None
+
+
+class TranscribeAdapter(JobAdapter):
+    """Transcribe jobs, listed in one call per status when they share a name fragment."""
+
+    name = "transcribe"
+    status_key = "TranscriptionJobStatus"
+
+    def __init__(self, client, job_name_contains=None):
+        self.client = client
+        self.job_name_contains = job_name_contains
+
+    def describe(self, job_id):
+        return self.client.get_transcription_job(TranscriptionJobName=job_id)['TranscriptionJob']
+
+    def list_done(self):
+        done_names = set()
+        for status in self.done_status:
+            kwargs = {'Status': status, 'JobNameContains': self.job_name_contains, 'MaxResults': 100}
+            while True:
+                response = self.client.list_transcription_jobs(**kwargs)
+                for summary in response.get('TranscriptionJobSummaries', []):
+                    done_names.add(summary['TranscriptionJobName'])
+                next_token = response.get('NextToken')
+                if not next_token:
+                    break
+                kwargs['NextToken'] = next_token
+        return done_names
+
+    async def poll(self, job_ids):
+        if not self.job_name_contains:
+            return await super().poll(job_ids)
+        try:
+            done_names = await asyncio.to_thread(self.list_done)
+        except ClientError as e:
+            error(f"Error listing transcribe jobs [{self.job_name_contains}]: {e}")
+            return {}
+        # only the finished jobs are described, to get their results
+        return await super().poll([job_id for job_id in job_ids if job_id in done_names])
+
+
+class TranslateAdapter(JobAdapter):
+    name = "translate"
+    status_key = "JobStatus"
+    done_status = ["COMPLETED", "COMPLETED_WITH_ERROR", "FAILED", "STOPPED", "STOP_REQUESTED"]
+
+    def __init__(self, client):
+        self.client = client
+
+    def describe(self, job_id):
+        return self.client.describe_text_translation_job(JobId=job_id)['TextTranslationJobProperties']
+
+
+class PollyAdapter(JobAdapter):
+    name = "polly"
+    status_key = "TaskStatus"
+    done_status = ["completed", "failed"]
+    min_interval = 10
+
+    def __init__(self, client):
+        self.client = client
+
+    def describe(self, job_id):
+        return self.client.get_speech_synthesis_task(TaskId=job_id)['SynthesisTask']
+
+
+class JobTracker:
+    """Watches many jobs of one service from a single poll loop.
+
+    The poll interval starts at the adapter's min_interval and grows while no job
+    finishes, up to its max_interval. Jobs not done before the timeout resolve to None.
+    """
+
+    def __init__(self, adapter, min_interval=None, max_interval=None, timeout=None, backoff=1.5):
+        self.adapter = adapter
+        self.min_interval = adapter.min_interval if min_interval is None else min_interval
+        self.max_interval = adapter.max_interval if max_interval is None else max_interval
+        self.timeout = adapter.timeout if timeout is None else timeout
+        self.backoff = backoff
+        self.waiting = {}
+        self.poller = None
+
+    def watch(self, job_id):
+        """Starts watching the job, returning a future with the done job."""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[job_id] = (future, time.monotonic() + self.timeout)
+        if not self.poller or self.poller.done():
+            self.poller = asyncio.create_task(self._poll_loop())
+        return future
+
+    async def wait(self, job_id):
+        return await self.watch(job_id)
+
+    async def _poll_loop(self):
+        interval = self.min_interval
+        while self.waiting:
+            await asyncio.sleep(interval)
+            job_ids = list(self.waiting)
+            try:
+                done_jobs = await self.adapter.poll(job_ids)
+            except Exception as e:
+                error(f"Error polling {len(job_ids)} {self.adapter.name} jobs: {e}")
+                done_jobs = {}
+            for job_id, job in done_jobs.items():
+                future, _ = self.waiting.pop(job_id)
+                info(f"{self.adapter.name} job {job_id} done: {job.get(self.adapter.status_key)}")
+                future.set_result(job)
+            now = time.monotonic()
+            for job_id, (future, deadline) in list(self.waiting.items()):
+                if now > deadline:
+                    error(f"Timed out waiting for {self.adapter.name} job {job_id}")
+                    del self.waiting[job_id]
+                    future.set_result(None)
+            if done_jobs:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            debug(f"Watching {len(self.waiting)} {self.adapter.name} jobs, next poll in {interval}s")
+
+
+class TrackerLoop:
+    """One event loop in a background thread, with a tracker per service, for jobs waited on from many threads."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.trackers = {}
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="job-tracker", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def wait(self, adapter, job_id):
+        """Blocks the calling thread until the job is done, returning it, or None if it timed out."""
+        async def watch():
+            # only touched from the loop thread
+            tracker = self.trackers.get(adapter.name)
+            if not tracker:
+                tracker = JobTracker(adapter, **self.kwargs)
+                self.trackers[adapter.name] = tracker
+            return await tracker.wait(job_id)
+        return asyncio.run_coroutine_threadsafe(watch(), self.loop).result()
+
+
+def wait_all(adapter, job_ids, **kwargs):
+    """Blocks until all the jobs are done, returning a job id to done job (or None) dict."""
+    async def watch_all():
+        tracker = JobTracker(adapter, **kwargs)
+        return await asyncio.gather(*(tracker.wait(job_id) for job_id in job_ids))
+    return dict(zip(job_ids, asyncio.run(watch_all())))
+
+
+def wait(adapter, job_id, **kwargs):
+    return wait_all(adapter, [job_id], **kwargs)[job_id]
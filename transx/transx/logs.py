@@ -1,32 +1,51 @@
 import logging
-from rich.logging import RichHandler
+import threading
 
+logger = logging.getLogger("rich_logger")
+# the level is known up front, so disabled messages never set up the handler
+logging.getLogger().setLevel("INFO")
 
-logger = None
-if not logger:
-    logging.basicConfig(
-        level="INFO",
-        format="%(message)s",
-        datefmt="[%X]",
-        handlers=[RichHandler(rich_tracebacks=True)]  # Use RichHandler
-    )
-    logger = logging.getLogger("rich_logger")
+_configured = False
+_configure_lock = threading.Lock()
 
 
-def info(msg, *args, **kwargs): 
-    logger.info(msg, *args, stacklevel=2, **kwargs)
+def get_logger():
+    """The transx logger, with its rich handler set up on the first message logged."""
+    global _configured
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                # rich takes a while to import, commands that never log skip it
+                from rich.logging import RichHandler
+                logging.basicConfig(
+                    level="INFO",
+                    format="%(message)s",
+                    datefmt="[%X]",
+                    handlers=[RichHandler(rich_tracebacks=True)]  # Use RichHandler
+                )
+                _configured = True
+    return logger
+
+
+def info(msg, *args, **kwargs):
+    if logger.isEnabledFor(logging.INFO):
+        get_logger().info(msg, *args, stacklevel=2, **kwargs)
 
 
 def error(msg, *args, **kwargs):
-    logger.error(msg, *args, stacklevel=2, **kwargs)
+    if logger.isEnabledFor(logging.ERROR):
+        get_logger().error(msg, *args, stacklevel=2, **kwargs)
 
 
 def debug(msg, *args, **kwargs):
-    logger.debug(msg, *args, stacklevel=2, **kwargs)
+    if logger.isEnabledFor(logging.DEBUG):
+        get_logger().debug(msg, *args, stacklevel=2, **kwargs)
 
 
 def warning(msg, *args, **kwargs):
-    logger.warning(msg, *args, stacklevel=2, **kwargs)
+    if logger.isEnabledFor(logging.WARNING):
+        get_logger().warning(msg, *args, stacklevel=2, **kwargs)
 
 def critical(msg, *args, **kwargs):
-    logger.critical(msg, *args, stacklevel=2, **kwargs)
+    if logger.isEnabledFor(logging.CRITICAL):
+        get_logger().critical(msg, *args, stacklevel=2, **kwargs)
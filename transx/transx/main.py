@@ -1,27 +1,26 @@
 from .cmd import cli
-# fundamentals
-from . import about, sync, config, clean, logscmd
-# features
-from . import transcribe, translate
-# developer preview
-from . import ssml, vimeo
 
-_commands = [
-    about.command,
-    config.command,
-    sync.command,
-    transcribe.command,
-    translate.command,
-    clean.command,
-    ssml.command,
-    vimeo.command,
-    logscmd.command
-]
+_commands = {
+    # fundamentals
+    "version": ".about",
+    "config": ".config",
+    "sync": ".sync",
+    "clean": ".clean",
+    "logs": ".logscmd",
+    # features
+    "transcribe": ".transcribe",
+    "translate": ".translate",
+    "run": ".pipeline",
+    # developer preview
+    "ssml": ".ssml",
+    "tts": ".tts",
+    "vimeo": ".vimeo",
+}
 
 
 def main():
-    for command in _commands:
-        cli.add_command(command)
+    for name, module_name in _commands.items():
+        cli.add_lazy_command(name, module_name)
     cli(obj={})
 
 
@@ -0,0 +1,82 @@
+"""Record of the files transx generated, kept in the state dir of the media directory."""
+import os
+import threading
+from pathlib import Path
+from .logs import *
+from .utils import *
+from .files import OUTPUT_DIRS
+
+MANIFEST_NAME = "manifest"
+
+_lock = threading.Lock()
+
+
+def find_root(file_path, directory=None):
+    """The dir whose state dir keeps the state of the file.
+
+    Files of a processed directory belong to the nearest state dir at or above that directory,
+    else to the directory itself, so one run keeps a single manifest. Other files belong to the
+    nearest state dir above them, else to their media dir.
+    """
+    file_path = Path(file_path).resolve()
+    state_dir = Config.STATE_DIR.resolve()
+    if directory:
+        directory = Path(directory).resolve()
+        if directory in file_path.parents:
+            for parent in [directory, *directory.parents]:
+                if (parent / state_dir).is_dir():
+                    return parent
+            return directory
+    for parent in file_path.parents:
+        if (parent / state_dir).is_dir():
+            return parent
+    # outputs are kept in the subs dirs next to their media
+    root = file_path.parent
+    while root.name in OUTPUT_DIRS:
+        root = root.parent
+    return root
+
+
+def record(*file_paths, directory=None):
+    """Appends the generated files to the manifest of their media directory."""
+    by_root = {}
+    for file_path in file_paths:
+        file_path = Path(file_path).resolve()
+        root = find_root(file_path, directory)
+        by_root.setdefault(root, []).append(os.path.relpath(file_path, root))
+    with _lock:
+        for root, rel_paths in by_root.items():
+            with open(state_path(root, MANIFEST_NAME), "a") as f:
+                f.write("".join(rel_path + "\n" for rel_path in rel_paths))
+            debug(f"Recorded {len(rel_paths)} outputs in the manifest of {root}")
+
+
+def manifest_path(directory):
+    return Path(directory) / Config.STATE_DIR.resolve() / MANIFEST_NAME
+
+
+def read(directory):
+    """The generated files recorded under the directory, or None if it has no manifest."""
+    path = manifest_path(directory)
+    if not path.is_file():
+        return None
+    root = Path(directory).resolve()
+    with _lock, open(path) as f:
+        rel_paths = dict.fromkeys(line.rstrip("\n") for line in f if line.strip())
+    return [(root / rel_path).resolve() for rel_path in rel_paths]
+
+
+def write(directory, file_paths):
+    """Replaces the manifest of the directory with the files."""
+    path = manifest_path(directory)
+    root = Path(directory).resolve()
+    # an empty manifest still tells clean that nothing else was generated
+    with _lock:
+        with open(path, "w") as f:
+            f.write("".join(os.path.relpath(file_path, root) + "\n" for file_path in file_paths))
+
+
+def find_manifests(directory):
+    """The dirs with a manifest that may list files under the directory: itself and the ones above it."""
+    directory = Path(directory).resolve()
+    return [parent for parent in reversed([directory, *directory.parents]) if manifest_path(parent).is_file()]
@@ -0,0 +1,205 @@
+import click
+import queue
+import threading
+import time
+from pprint import pformat
+from .utils import *
+from .logs import *
+from .jobs import TrackerLoop
+from . import cmd, files, sync, transcribe, translate, vimeo
+
+STAGES = ["sync", "transcribe", "translate", "vimeo"]
+
+_DONE = object()
+
+
+class Stage:
+    """A pipeline step run by a few worker threads between two bounded queues."""
+
+    def __init__(self, name, func, workers):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.running = workers
+        self.lock = threading.Lock()
+
+    def work(self, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                # let the sibling workers see the end of the stream too
+                inbox.put(_DONE)
+                break
+            self.process(item, outbox)
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            outbox.put(_DONE)
+
+    def process(self, item, outbox):
+        # items that failed in an earlier stage are only passed along
+        if item["status"] == "ok":
+            media = item["file"]
+            t0 = time.time()
+            try:
+                ok = self.func(item)
+            except Exception as e:
+                error(f"Stage [{self.name}] failed for [{media}]: {e}")
+                ok = False
+            item["stages"][self.name] = round(time.time() - t0, 3)
+            if ok:
+                info(f"Stage [{self.name}] done for [{media.name}] in {item['stages'][self.name]}s")
+            else:
+                item["status"] = f"{self.name} failed"
+        outbox.put(item)
+
+
+def run_stages(items, stages, queue_size):
+    """Streams the items through the stages, each one starting as soon as the previous stage hands it over."""
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    threads = []
+    for stage, inbox, outbox in zip(stages, queues, queues[1:]):
+        for i in range(stage.workers):
+            thread = threading.Thread(target=stage.work, args=(inbox, outbox), name=f"{stage.name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    def feed():
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+    threading.Thread(target=feed, name="feed", daemon=True).start()
+    results = []
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        results.append(item)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def sync_stage(directory, bucket_name, config, index, cache):
+    def stage_func(item):
+        sync.sync_file(bucket_name, directory, item["file"], config, index, cache)
+        return True
+    return stage_func
+
+
+def run_job_name(kind, name, batch, item):
+    """A job name unique to the media in the run, as medias of different folders may share a name."""
+    return f"{kind}__{name}__{batch}_{item['index']}"
+
+
+def transcribe_stage(directory, bucket_name, tracker, batch):
+    def stage_func(item):
+        media = item["file"]
+        job_name = run_job_name("transcribe", media.name, batch, item)
+        job_info = transcribe.start_transcribe_job(directory, media, bucket_name, job_name)
+        if not job_info:
+            return False
+        done_job = transcribe.wait_job_done(media, job_name, tracker, directory)
+        if not done_job or done_job.get("TranscriptionJobStatus") != "COMPLETED":
+            return False
+        item["transcripts"] = transcribe.download(media, bucket_name, done_job, directory)
+        return True
+    return stage_func
+
+
+def translate_stage(directory, bucket_name, tracker, batch):
+    def stage_func(item):
+        media = item["file"]
+        vtts = [t for t in item.get("transcripts", []) if t.suffix == ".vtt"]
+        if not vtts:
+            warning(f"No transcripts to translate for [{media}]")
+            return False
+        # each media gets its own input folder, so the job only translates its transcripts
+        rel_dir = media.parent.relative_to(directory)
+        translate_prefix = str(rel_dir / "subs" / media.stem)
+        for vtt in vtts:
+            vtt_key = s3_key("user", translate_prefix, vtt.name)
+            s3.upload_file(Filename=str(vtt), Bucket=bucket_name, Key=vtt_key)
+        job_name = run_job_name("translate", media.stem, batch, item)
+        job_info = translate.start_translate_job(translate_prefix, bucket_name, job_name)
+        if not job_info:
+            return False
+        done_job = translate.wait_job_done(translate_prefix, job_info, tracker)
+        if not done_job or done_job.get("JobStatus") not in ["COMPLETED", "COMPLETED_WITH_ERROR"]:
+            return False
+        output_s3_url = done_job.get("OutputDataConfig").get("S3Uri")
+        translate.s3_download_all(media.parent / "subtitles", output_s3_url, directory)
+        return True
+    return stage_func
+
+
+def vimeo_stage(user_folder):
+    def stage_func(item):
+        return vimeo.vimeo_sync(item["file"], user_folder)["status"] == "DONE"
+    return stage_func
+
+
+def run(directory, bucket_name, stage_names=None, jobs=None, queue_size=None):
+    """Streams every media file through sync, transcribe, translate and vimeo."""
+    directory = resolve(Config.MEDIA_PATH, directory)
+    bucket_name = resolve(Config.BUCKET_NAME, bucket_name)
+    stage_names = stage_names or STAGES
+    jobs = resolve(Config.PIPELINE_JOBS, jobs)
+    queue_size = resolve(Config.PIPELINE_QUEUE_SIZE, queue_size)
+    medias = files.find_medias(directory)
+    info(f"Running stages {stage_names} for {len(medias)} medias in {directory}")
+    stages = []
+    cache = None
+    # the transcribe and translate jobs of all the medias are polled from one loop
+    tracker = TrackerLoop()
+    # the jobs of a run share the stamp, each media numbered so their names never collide
+    batch = secondstamp()
+    if "sync" in stage_names:
+        sync.ensure_bucket_exists(bucket_name)
+        index = sync.remote_index(bucket_name, s3_key("user"))
+        cache = sync.etag_cache(state_path(directory, "etags.json"))
+        func = sync_stage(directory, bucket_name, sync.transfer_config(), index, cache)
+        stages.append(Stage("sync", func, jobs))
+    if "transcribe" in stage_names:
+        stages.append(Stage("transcribe", transcribe_stage(directory, bucket_name, tracker, batch), jobs))
+    if "translate" in stage_names:
+        stages.append(Stage("translate", translate_stage(directory, bucket_name, tracker, batch), jobs))
+    if "vimeo" in stage_names:
+        vimeo.reset_state(directory)
+        user_folder = vimeo.user_folder()
+        if not user_folder:
+            error("Could not find vimeo user folder")
+            return None
+        stages.append(Stage("vimeo", vimeo_stage(user_folder), jobs))
+    items = ({"file": media, "index": i, "status": "ok", "stages": {}} for i, media in enumerate(medias))
+    tracker.start()
+    try:
+        results = run_stages(items, stages, queue_size)
+    finally:
+        tracker.stop()
+        if cache:
+            cache.save()
+    failed = [item for item in results if item["status"] != "ok"]
+    info(f"Processed {len(results)} medias, {len(failed)} failed.")
+    return {
+        "status": "ok" if not failed else "error",
+        "medias": results
+    }
+
+
+@cmd.cli.command('run')
+@click.option('--directory', default=None, help='Directory to search in')
+@click.option('--bucket_name', default=None, help='Bucket name')
+@click.option('--stages', default=",".join(STAGES), help='Comma separated stages to run')
+@click.option('--jobs', default=None, type=int, help='Number of medias each stage processes concurrently')
+@click.option('--queue_size', default=None, type=int, help='Number of medias waiting between stages')
+def command(directory, bucket_name, stages, jobs, queue_size):
+    """Streams media files through sync, transcribe, translate and vimeo."""
+    stage_names = [stage.strip() for stage in stages.split(",") if stage.strip()]
+    unknown = set(stage_names) - set(STAGES)
+    if unknown:
+        raise click.BadParameter(f"Unknown stages {sorted(unknown)}, expected {STAGES}")
+    result = run(directory, bucket_name, stage_names, jobs, queue_size)
+    info(pformat(result))
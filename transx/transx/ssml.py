@@ -2,54 +2,84 @@ import click
 from pprint import pformat
 from .logs import *
 from .utils import *
-from . import cmd, files
-import webvtt
-from pyssml.PySSML import PySSML
+from . import cmd, files, manifest
+import html
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from xml.sax.saxutils import escape
 from pathlib import Path
-import xml.dom.minidom
+from . import cues, timing
 
+# voice, class and styling spans of the cue text, which are not spoken
+CUE_TAG = re.compile(r"<[^>]*>")
 
-def to_ssml(vtt_file_path):
-    # convert vtt to ssml
-    # ???????
-    # write to file
-    vtt_file = Path(vtt_file_path)
-    ssml_file = vtt_file.with_suffix('.ssml')
 
-    # Initialize PySSML object
-    ssml = PySSML()
+def cue_text(cue):
+    """The spoken text of a cue, as plain text."""
+    text = CUE_TAG.sub("", cue.text)
+    return html.unescape(" ".join(text.split()))
+
 
-    # Read VTT file and generate SSML content with timing
-    for caption in webvtt.read(vtt_file):
-        start_time = caption.start_in_seconds
-        end_time = caption.end_in_seconds
-        duration = end_time - start_time
-        ssml.say(caption.text)
-        ssml.pause(str(int(duration * 1000)) + 'ms')  # Add a break based on the duration of the caption
+def write_ssml(captions, fp, timeline):
+    """Writes the captions as an SSML document, one caption at a time, timed by the timeline."""
+    fp.write('<?xml version="1.0" ?>\n<speak>\n')
+    captions = iter(captions)
+    caption = next(captions, None)
+    while caption:
+        # the next caption bounds how long this one may take
+        next_caption = next(captions, None)
+        text = cue_text(caption)
+        if text:
+            next_start = next_caption.start if next_caption else None
+            breaks, rate = timeline.fit(caption.start, caption.end, next_start, text)
+            for ms in breaks:
+                fp.write(f'  <break time="{ms}ms"/>\n')
+            if rate == 100:
+                fp.write(f"  {escape(text)}\n")
+            else:
+                fp.write(f'  <prosody rate="{rate}%">{escape(text)}</prosody>\n')
+        caption = next_caption
+    fp.write("</speak>\n")
 
-    ssml_string = ssml.ssml()
-    dom = xml.dom.minidom.parseString(ssml_string)
-    pretty_ssml = dom.toprettyxml(indent="  ")
-    # Write SSML to file
-    with open(ssml_file, 'w') as f:
-        f.write(pretty_ssml)
 
-    return ssml_file
+def to_ssml(vtt_file_path, lang_code=None, directory=None):
+    """Writes the SSML of a VTT file next to it, returning the timing report of the file."""
+    vtt_file = Path(vtt_file_path)
+    ssml_file = vtt_file.with_suffix('.ssml')
+    tmp_file = ssml_file.with_name(ssml_file.name + ".tmp")
+    lang_code = lang_code or timing.lang_of(vtt_file)
+    timeline = timing.Timeline(lang_code)
+    with open(vtt_file, "r") as fp_in, open(tmp_file, "w") as fp_out:
+        write_ssml(cues.read_cues(fp_in), fp_out, timeline)
+    os.replace(tmp_file, ssml_file)
+    manifest.record(ssml_file, directory=directory)
+    report = {"ssml": str(ssml_file), "lang_code": lang_code} | timeline.report()
+    info(f"Wrote [{ssml_file}] in [{lang_code}], max drift [{report['max_drift_ms']}ms], "
+         f"[{report['adjusted_cues']}/{report['cues']}] cues sped up.")
+    return report
 
 
-def run(directory):
-    vtts = files.find_vtt(directory)
-    info(f"Converting {len(vtts)} VTT files to SSML.")
-    for vtt in vtts:
-        to_ssml(vtt)
-    return vtts
+def run(directory, file_index=None, jobs=None):
+    vtts = files.find_vtt(file_index or directory)
+    directory = file_index.directory if file_index else directory
+    jobs = resolve(Config.SSML_JOBS, jobs) or os.cpu_count()
+    info(f"Converting {len(vtts)} VTT files to SSML in {jobs} processes.")
+    if not vtts:
+        return []
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(jobs, len(vtts)), mp_context=mp_context) as executor:
+        return list(executor.map(partial(to_ssml, directory=directory), vtts))
 
 
 @cmd.cli.command('ssml')
 @click.option('--directory', default=None, help='Directory to search in')
 @click.option('--bucket_name', default=None, help='Bucket name')
-def command(directory, bucket_name):
+@click.option('--jobs', default=None, type=int, help='Number of processes converting files')
+def command(directory, bucket_name, jobs):
     """Generates SSML files."""
-    directory = resolve(Config.TRANSX_PATH, directory)
-    result = run(directory)
+    directory = resolve(Config.MEDIA_PATH, directory)
+    result = run(directory, jobs=jobs)
     info(pformat(result))
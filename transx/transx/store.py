@@ -0,0 +1,112 @@
+"""JSON files of state kept between runs, in the state dir of the media directories."""
+import os
+import json
+import threading
+from pathlib import Path
+from .logs import *
+
+
+class JsonStore:
+    """Entries kept in a JSON file, loaded once and written whole through a temp file.
+
+    Stores with autosave write the file on every change, as the process may die at any
+    time. The others only write it on save.
+    """
+
+    name = "state"
+    autosave = True
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                warning(f"Ignoring unreadable {self.name} [{self.path}]: {e}")
+        debug(f"Loaded [{len(self.entries)}] entries of {self.name} [{self.path}]")
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self._changed()
+
+    def remove(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._changed()
+
+    def save(self):
+        with self.lock:
+            if self.dirty:
+                self._write()
+
+    def _changed(self):
+        # called with the lock held
+        self.dirty = True
+        if self.autosave:
+            self._write()
+
+    def _write(self):
+        tmp_file = self.path.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_file, self.path)
+        self.dirty = False
+        debug(f"Saved [{len(self.entries)}] entries of {self.name} [{self.path}]")
+
+
+class FileStore(JsonStore):
+    """Entries about local files, keyed by path and dropped once the file size or mtime change."""
+
+    @staticmethod
+    def _stat(file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def _current(self, file_path):
+        """The entry of the file as it is now, created if missing or stale. Called with the lock held."""
+        path, size, mtime_ns = self._stat(file_path)
+        entry = self.entries.get(path)
+        if not entry or entry['size'] != size or entry['mtime_ns'] != mtime_ns:
+            entry = {'size': size, 'mtime_ns': mtime_ns}
+            self.entries[path] = entry
+        return entry
+
+    def get(self, file_path):
+        path, size, mtime_ns = self._stat(file_path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if not entry or entry['size'] != size or entry['mtime_ns'] != mtime_ns:
+                return None
+            return dict(entry)
+
+    def put(self, file_path, **fields):
+        with self.lock:
+            self._current(file_path).update(fields)
+            self._changed()
+
+    def remove(self, file_path):
+        super().remove(os.path.abspath(file_path))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def shared_store(path, factory):
+    """The store of the file, loaded once and shared by every thread using it."""
+    path = Path(path).resolve()
+    with _stores_lock:
+        store = _stores.get(path)
+        if not store:
+            store = factory(path)
+            _stores[path] = store
+    return store
@@ -1,70 +1,80 @@
-import boto3
-import hashlib
+from boto3.s3.transfer import TransferConfig
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pprint import pformat
 from .utils import *
 from .ls import * 
 from .config import Config
 from .logs import *
-from . import cmd
+from .etags import *
+from . import cmd, aws
 from . import files
 
-DEFAULT_S3CMD_PART_SIZE = 15728640
+s3 = aws.LazyClient('s3')
 
-DEFAULT_AWS_PART_SIZE = 8388608
 
-s3 = boto3.client('s3')
+def remote_index(bucket_name, prefix):
+    """Lists all objects under the prefix once, mapping each key to its (ETag, size)."""
+    index = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            index[obj['Key']] = (obj['ETag'].strip('"'), obj['Size'])
+    info(f"Found {len(index)} objects in s3://{bucket_name}/{prefix}")
+    return index
 
 
-def calc_etag(input_file, part_size):
-    md5_digests = []
-    with open(input_file, 'rb') as f:
-        for chunk in iter(lambda: f.read(part_size), b''):
-            md5_digests.append(hashlib.md5(chunk).digest())
-    result = hashlib.md5(b''.join(md5_digests)).hexdigest() + '-' + str(len(md5_digests))
-    return result
-
-
-def factor_of_1mb(filesize, num_parts):
-    x = filesize / int(num_parts)
-    y = x % 1048576
-    return int(x + 1048576 - y)
-
-
-def possible_part_sizes(filesize, num_parts):
-    return lambda part_size: part_size < filesize and (float(filesize) / float(part_size)) <= num_parts
-
-
-def is_synced(file_path, s3_bucket, s3_key):
-    """Check if the file is already synced with S3 by comparing stored md5."""
-    # From https://teppen.io/2018/10/23/aws_s3_verify_etags/
-    # Get the S3 object's metadata (including ETag, which is usually the MD5 checksum)
+def remote_object(s3_bucket, s3_key, index=None):
+    """Returns the (ETag, size) of the S3 object, or None if it does not exist."""
+    if index is not None:
+        return index.get(s3_key)
     try:
         response = s3.head_object(Bucket=s3_bucket, Key=s3_key)
         s3_etag = response.get('ETag', None)
-
-        if s3_etag:
-            s3_etag = s3_etag.strip('"')
-            filesize = os.path.getsize(file_path)
-            etag_arr = s3_etag.split('-')
-            if len(etag_arr) == 1:
-                local_etag = etag_arr[0]
-                return s3_etag == local_etag
-            if len(etag_arr) == 2:
-                num_parts = int(etag_arr[1])
-                default_part_sizes = [
-                    DEFAULT_AWS_PART_SIZE,
-                    DEFAULT_S3CMD_PART_SIZE,
-                    factor_of_1mb(filesize, num_parts)
-                ]
-                for part_size in filter(possible_part_sizes(filesize, num_parts), default_part_sizes):
-                    local_etag = calc_etag(file_path, part_size)
-                    if s3_etag == local_etag:
-                        return True
-        return False
+        if not s3_etag:
+            return None
+        return s3_etag.strip('"'), response.get('ContentLength')
     except ClientError as e:
         # Handle the case where the S3 object does not exist or an error occurs
         debug(f"Key not found {s3_key}: {e}")
+        return None
+
+
+def is_synced(file_path, s3_bucket, s3_key, index=None, cache=None):
+    """Check if the file is already synced with S3 by comparing stored md5."""
+    # From https://teppen.io/2018/10/23/aws_s3_verify_etags/
+    # Get the S3 object's metadata (including ETag, which is usually the MD5 checksum)
+    remote = remote_object(s3_bucket, s3_key, index)
+    if not remote:
+        return False
+    s3_etag, s3_size = remote
+    filesize = os.path.getsize(file_path)
+    if s3_size is not None and s3_size != filesize:
         return False
+    part_sizes = candidate_part_sizes(s3_etag, filesize)
+    if is_cached(file_path, s3_etag, part_sizes, cache):
+        return True
+    etags = local_etags(file_path, part_sizes, cache)
+    return s3_etag in etags.values()
+
+
+def is_cached(file_path, s3_etag, part_sizes, cache):
+    """Whether the ETag is cached for the file, so the other part sizes need no hashing."""
+    return bool(cache) and any(cache.get(file_path, part_size) == s3_etag for part_size in part_sizes)
+
+
+def missing_part_sizes(file_path, s3_key, index, cache):
+    """Part sizes still to be hashed before the file can be compared with its S3 object."""
+    remote = index.get(s3_key)
+    if not remote:
+        return []
+    s3_etag, s3_size = remote
+    if s3_size != os.path.getsize(file_path):
+        return []
+    part_sizes = candidate_part_sizes(s3_etag, s3_size)
+    if is_cached(file_path, s3_etag, part_sizes, cache):
+        return []
+    return [part_size for part_size in part_sizes if not cache.get(file_path, part_size)]
 
 
 def ensure_bucket_exists(bucket_name):
@@ -89,8 +99,10 @@ def ensure_bucket_exists(bucket_name):
 @cmd.cli.command('sync')
 @click.option('--directory', default=None, help='Directory to search in')
 @click.option('--bucket_name', default=None, help='Bucket name')
-def command(directory, bucket_name):
-    result = run(directory, bucket_name)
+@click.option('--jobs', default=None, type=int, help='Number of files to sync concurrently')
+@click.option('--hash_jobs', default=None, type=int, help='Number of processes hashing files')
+def command(directory, bucket_name, jobs, hash_jobs):
+    result = run(directory, bucket_name, jobs, hash_jobs)
     info(pformat(result))
 
 
@@ -103,19 +115,56 @@ def is_media(file_path):
     return result
 
 
-def run(directory, bucket_name):
+def transfer_config():
+    """Transfer settings shared by all upload workers."""
+    return TransferConfig(
+        max_concurrency=resolve(Config.TRANSFER_MAX_CONCURRENCY),
+        multipart_chunksize=resolve(Config.TRANSFER_CHUNK_SIZE),
+        multipart_threshold=resolve(Config.TRANSFER_CHUNK_SIZE))
+
+
+def run(directory, bucket_name, jobs=None, hash_jobs=None, file_index=None):
     """Sync files to S3, checking each file for changes and uploading only if necessary."""
     directory = resolve(Config.MEDIA_PATH, directory)
     bucket_name = resolve(Config.BUCKET_NAME, bucket_name)
-    info(f"Syncing files in {directory} to s3://{bucket_name}")
+    jobs = resolve(Config.SYNC_JOBS, jobs)
+    hash_jobs = resolve(Config.HASH_JOBS, hash_jobs) or os.cpu_count()
+    info(f"Syncing files in {directory} to s3://{bucket_name} with {jobs} jobs")
     ensure_bucket_exists(bucket_name)
-    all_files = files.find_all(directory)
+    all_files = files.find_all(file_index or directory)
+    index = remote_index(bucket_name, s3_key("user"))
+    cache = etag_cache(state_path(directory, "etags.json"))
+    config = transfer_config()
+    # spawn the hashing processes, forking next to the upload threads is not safe
+    mp_context = multiprocessing.get_context("spawn")
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as uploads, \
+                ProcessPoolExecutor(max_workers=hash_jobs, mp_context=mp_context) as hashes:
+            upload_futures = []
+            hash_futures = {}
+            for file_path in all_files:
+                missing = missing_part_sizes(file_path, file_key(directory, file_path), index, cache)
+                # small files are cheaper to hash in the upload worker than in another process
+                if missing and os.path.getsize(file_path) >= DEFAULT_AWS_PART_SIZE:
+                    hash_futures[hashes.submit(calc_etags, file_path, missing)] = file_path
+                else:
+                    upload_futures.append(uploads.submit(sync_file, bucket_name, directory, file_path, config, index, cache))
+            info(f"Hashing {len(hash_futures)} files in {hash_jobs} processes")
+            for future in as_completed(hash_futures):
+                file_path = hash_futures[future]
+                for part_size, etag in future.result().items():
+                    cache.put(file_path, part_size, etag)
+                upload_futures.append(uploads.submit(sync_file, bucket_name, directory, file_path, config, index, cache))
+            # consume the results so worker exceptions are raised here
+            for future in upload_futures:
+                future.result()
+    finally:
+        cache.save()
     out_files = []
     out_dirs = set([])
     subtitle_prefixes = set([])
     synced_medias = set([])
     for file_path in all_files:
-        sync_file(bucket_name, directory, file_path)
         result = {
             "file": file_path,
             "dir": file_path.parent
@@ -139,16 +188,48 @@ def run(directory, bucket_name):
     return result
 
 
-def sync_file(bucket_name, directory, file_path):
+def uploaded_part_size(file_size, config=None):
+    """Part size of the ETag S3 gives to a file uploaded with the transfer config."""
+    config = config or TransferConfig()
+    if file_size < config.multipart_threshold:
+        return WHOLE_FILE
+    return config.multipart_chunksize
+
+
+def cache_uploaded_etag(file_path, stat, bucket_name, s3_key, config, cache):
+    """Caches the ETag of the uploaded file, so the next sync compares it without hashing."""
+    remote = remote_object(bucket_name, s3_key)
+    current = os.stat(file_path)
+    if not remote or (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        # changed while uploading, the object may hold either content
+        return
+    s3_etag, s3_size = remote
+    part_size = uploaded_part_size(s3_size, config)
+    parts = s3_etag.split('-')
+    if part_size == WHOLE_FILE:
+        expected = len(parts) == 1
+    else:
+        expected = len(parts) == 2 and int(parts[1]) == -(-s3_size // part_size)
+    if expected:
+        cache.put(file_path, part_size, s3_etag)
+    else:
+        debug(f"ETag [{s3_etag}] of s3://{bucket_name}/{s3_key} is not of part size [{part_size}], not cached")
+
+
+def sync_file(bucket_name, directory, file_path, config=None, index=None, cache=None):
     s3_key = file_key(directory, file_path)
-    if is_synced(file_path, bucket_name, s3_key):
+    if is_synced(file_path, bucket_name, s3_key, index, cache):
         info(f"File {file_path} in sync with s3://{bucket_name}/{s3_key}")
         return
     try:
+        stat = os.stat(file_path)
         s3.upload_file(
             Filename=str(file_path),
             Bucket=bucket_name,
-            Key=s3_key)
+            Key=s3_key,
+            Config=config)
         info(f"File {file_path} uploaded to s3://{bucket_name}/{s3_key}")
+        if cache:
+            cache_uploaded_etag(file_path, stat, bucket_name, s3_key, config, cache)
     except ClientError as e:
         error(f"File {file_path} sync failed to s3://{bucket_name}/{s3_key}. Error: {e}")
@@ -1,15 +1,137 @@
+import os
+import re
+import glob
+import threading
+from types import MappingProxyType
 from .logs import *
 from .config import *
+from . import config, cues, terms_static
 
-def fix_terms(file_path, lang_code, out_path):
-    the_terms = Config.terms(lang_code)
 
-    with open(file_path, "r") as fp:
-        text = fp.read()
+class TermMatcher:
+    """Replaces every term of a glossary in a single pass over the text."""
+
+    def __init__(self, the_terms, word_boundary=False, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.replacements = {}
         for term, replacement in the_terms.items():
-            text = text.replace(term, replacement)
-    out_abs_path = out_path.resolve()
-    with open(out_abs_path, "w") as fp:
-        fp.write(text)
-    info(f"Replaced [{len(the_terms)}] terms from file[{str(file_path)}] to file[{str(out_abs_path)}] successfully.")
+            self.replacements.setdefault(self._key(term), replacement)
+        # longest terms first, so a term wins over the shorter terms it contains
+        alternation = "|".join(re.escape(term) for term in sorted(the_terms, key=len, reverse=True))
+        if word_boundary:
+            alternation = rf"(?<!\w)(?:{alternation})(?!\w)"
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regex = re.compile(alternation, flags) if the_terms else None
+
+    def _key(self, term):
+        return term.lower() if self.ignore_case else term
+
+    def _replace(self, match):
+        return self.replacements[self._key(match.group(0))]
+
+    def replace(self, text):
+        """Returns the text with the terms replaced and the number of replacements."""
+        if not self.regex:
+            return text, 0
+        return self.regex.subn(self._replace, text)
+
+
+class TermSet:
+    """Immutable terms of one language, with their compiled matchers attached."""
+
+    def __init__(self, lang_code, version, the_terms):
+        self.lang_code = lang_code
+        self.version = version
+        self.terms = MappingProxyType({str(term): str(replacement) for term, replacement in the_terms.items()})
+        self._matchers = {}
+        self._lock = threading.Lock()
+
+    def matcher(self, word_boundary=False, ignore_case=False):
+        key = (word_boundary, ignore_case)
+        with self._lock:
+            result = self._matchers.get(key)
+            if not result:
+                result = TermMatcher(self.terms, word_boundary, ignore_case)
+                self._matchers[key] = result
+        return result
+
+
+class TermsRegistry:
+    """Terms of every language, merged once and rebuilt when the settings files change on disk."""
+
+    def __init__(self, settings_files):
+        self.settings_files = settings_files
+        self.version = 0
+        self.stamp = None
+        self.term_sets = {}
+        self._lock = threading.Lock()
 
+    def _files_stamp(self):
+        paths = sorted(set(path for pattern in self.settings_files for path in glob.glob(pattern)))
+        return tuple((path, os.stat(path).st_mtime_ns) for path in paths)
+
+    def _load(self, stamp):
+        if self.version:
+            settings.reload()
+        static_ts = terms_static.default_terms
+        cfg_ts = settings.get("terms") or {}
+        all_terms = (static_ts.get("__all__") or {}) | (cfg_ts.get("__all__") or {})
+        self.version += 1
+        term_sets = {"__all__": TermSet("__all__", self.version, all_terms)}
+        for lang_code in set(static_ts) | set(cfg_ts):
+            if lang_code == "__all__":
+                continue
+            lang_terms = all_terms | (static_ts.get(lang_code) or {}) | (cfg_ts.get(lang_code) or {})
+            term_sets[lang_code] = TermSet(lang_code, self.version, lang_terms)
+        self.term_sets = term_sets
+        self.stamp = stamp
+        debug(f"Loaded terms version [{self.version}] for languages {sorted(term_sets)}")
+
+    def get(self, lang_code=None):
+        """Terms of the language, falling back to its base language (en-US to en) and then to __all__."""
+        stamp = self._files_stamp()
+        with self._lock:
+            if stamp != self.stamp:
+                self._load(stamp)
+            term_sets = self.term_sets
+        lang_code = lang_code or "__all__"
+        base_code = lang_code.split("-")[0].split("_")[0]
+        return term_sets.get(lang_code) or term_sets.get(base_code) or term_sets["__all__"]
+
+
+registry = TermsRegistry(config._SETTINGS)
+
+
+def matcher(lang_code):
+    """Compiled matcher of the current terms of a language."""
+    word_boundary = Config.TERMS_MATCH.resolve() == "word"
+    ignore_case = Config.TERMS_CASE.resolve() == "insensitive"
+    return registry.get(lang_code).matcher(word_boundary, ignore_case)
+
+
+def fix_cues(fp_in, fp_out, the_matcher):
+    """Streams the subtitles cue by cue, replacing terms only in the cue text."""
+    count = 0
+    for i, block in enumerate(cues.read_blocks(fp_in)):
+        lines = block.head_lines
+        if block.is_cue:
+            text, replaced = the_matcher.replace(block.text)
+            count += replaced
+            lines = lines + text.split("\n")
+        cues.write_block(fp_out, lines, first=i == 0)
+    return count
+
+
+def fix_terms(file_path, lang_code, out_path):
+    the_matcher = matcher(lang_code)
+    out_abs_path = out_path.resolve()
+    # write next to the output first, the input may be the output itself
+    tmp_path = out_abs_path.with_name(out_abs_path.name + ".tmp")
+    with open(file_path, "r") as fp_in, open(tmp_path, "w") as fp_out:
+        if file_path.suffix in cues.SUBTITLE_SUFFIXES:
+            count = fix_cues(fp_in, fp_out, the_matcher)
+        else:
+            text, count = the_matcher.replace(fp_in.read())
+            fp_out.write(text)
+    os.replace(tmp_path, out_abs_path)
+    info(f"Replaced [{count}] terms from file[{str(file_path)}] to file[{str(out_abs_path)}] successfully.")
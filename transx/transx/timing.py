@@ -0,0 +1,90 @@
+"""Fits the synthesized speech of subtitle cues to their timings."""
+import re
+from .config import Config
+
+# characters spoken per second at the normal rate, by base language
+SPEECH_RATES = {
+    "en": 15.0,
+    "pt": 14.5,
+    "es": 16.0,
+    "ca": 15.5,
+    "fr": 15.5,
+    "it": 15.5,
+    "de": 14.0,
+}
+
+DEFAULT_SPEECH_RATE = 15.0
+
+# longest break SSML engines (Polly) accept in a single tag
+MAX_BREAK_MS = 10000
+
+LANG_CODE = re.compile(r"^[a-z]{2}([-_][A-Za-z]{2})?$")
+
+
+def lang_of(file_path):
+    """Language of a subtitle file from its name (a.en-US.vtt, pt.a.vtt), or the source language."""
+    for part in file_path.name.split(".")[:-1]:
+        if LANG_CODE.match(part):
+            return part
+    return Config.SOURCE_LANG.resolve()
+
+
+def speech_rate(lang_code):
+    base_code = lang_code.split("-")[0].split("_")[0].lower()
+    return SPEECH_RATES.get(base_code, DEFAULT_SPEECH_RATE)
+
+
+def split_break(ms):
+    """Breaks of up to MAX_BREAK_MS adding up to ms."""
+    breaks = []
+    while ms > 0:
+        breaks.append(min(ms, MAX_BREAK_MS))
+        ms -= MAX_BREAK_MS
+    return breaks
+
+
+class Timeline:
+    """Tracks where the synthesized audio is against the cue timings, cue by cue.
+
+    Each cue may take up to the start of the next one. When its estimated speech
+    does not fit, including the drift already accumulated, it is sped up, up to the
+    max rate. The gaps until each cue starts are filled with breaks.
+    """
+
+    def __init__(self, lang_code, tolerance_ms=None, max_rate=None):
+        self.chars_per_second = speech_rate(lang_code)
+        self.tolerance = Config.SSML_TOLERANCE_MS.resolve(tolerance_ms) / 1000
+        self.max_rate = Config.SSML_MAX_RATE.resolve(max_rate) / 100
+        self.position = 0.0
+        self.last_end = 0.0
+        self.cues = 0
+        self.adjusted = 0
+        self.max_drift = 0.0
+        self.late_cues = 0
+
+    def fit(self, start, end, next_start, text):
+        """Returns the breaks (ms) before the cue and its speech rate (percent, 100 is normal)."""
+        self.cues += 1
+        drift = max(self.position - start, 0.0)
+        self.max_drift = max(self.max_drift, drift)
+        if drift > self.tolerance:
+            self.late_cues += 1
+        breaks = split_break(int(round((start - self.position) * 1000)))
+        available = max((next_start if next_start is not None else end) - start - drift, 0.001)
+        estimated = len(text) / self.chars_per_second
+        rate = 1.0
+        if estimated > available + self.tolerance:
+            rate = min(estimated / available, self.max_rate)
+            self.adjusted += 1
+        self.position = max(self.position, start) + estimated / rate
+        self.last_end = end
+        return breaks, int(round(rate * 100))
+
+    def report(self):
+        return {
+            "cues": self.cues,
+            "adjusted_cues": self.adjusted,
+            "late_cues": self.late_cues,
+            "max_drift_ms": int(round(self.max_drift * 1000)),
+            "end_drift_ms": int(round(max(self.position - self.last_end, 0.0) * 1000)),
+        }
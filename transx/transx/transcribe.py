@@ -1,11 +1,11 @@
 import click
 from pprint import pformat
 from .utils import *
-from . import cmd, terms, sync
+from . import cmd, terms, sync, jobs, aws, manifest
 from .logs import *
-from tenacity import retry, wait_exponential, stop_after_delay
+import asyncio
 
-transcribe = boto3.client('transcribe')
+transcribe = aws.LazyClient('transcribe')
 
 
 def start_transcribe_job(directory, file_path, bucket_name, job_name):
@@ -53,42 +53,75 @@ def start_transcribe_job(directory, file_path, bucket_name, job_name):
         return None
 
 
-@retry(wait=wait_exponential(multiplier=4, min=30, max=2*60), stop=stop_after_delay(60*60))
-def wait_job_done(file_name, job_name):
-    """Polls the transcribe job status until completion or failure."""
-    try:
-        response = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-        job = response['TranscriptionJob']
-        status = job['TranscriptionJobStatus']
-        info(f"Current status of job {job_name}: {status}")
-        if status in ['COMPLETED', 'FAILED']:
-            lang_codes = job.get('LanguageCodes')
-            job_json = json.dumps({
-                "TranscriptionJobName": job.get("TranscriptionJobName"),
-                "LanguageCodes": lang_codes
-            }, indent=2);
-            info(job_json)
-            info("=====")
-            file_path = Path(file_name)
-            file_dir = file_path.parent
-            subs_dir = file_dir / "subs"
-            out_name = file_path.with_suffix(".transcribe.json")
-            # use subs dir
-            out_file = subs_dir / out_name.name
-            if not subs_dir.exists():
-                subs_dir.mkdir()
-            info(f"Writing done job info to file[{out_file}] ")
-            with open(out_file, "w") as f:
-                f.write(job_json)
-            info(pformat(job))
-            return job
-        raise Exception(f"Job {job_name} not done yet.")
-    except ClientError as e:
-        error(f"Error fetching job status for {job_name}: {e}")
-        return None
+def wait_job_done(file_name, job_name, tracker=None, directory=None):
+    """Polls the transcribe job status until completion or failure, on the tracker loop if given."""
+    adapter = jobs.TranscribeAdapter(transcribe)
+    if tracker:
+        job = tracker.wait(adapter, job_name)
+    else:
+        job = jobs.wait(adapter, job_name)
+    if job:
+        write_job(file_name, job, directory)
+    return job
+
+
+def write_job(file_name, job, directory=None):
+    """Writes the languages of a done job next to the media, in its subs dir, recorded in the manifest of the directory."""
+    lang_codes = job.get('LanguageCodes')
+    job_json = json.dumps({
+        "TranscriptionJobName": job.get("TranscriptionJobName"),
+        "LanguageCodes": lang_codes
+    }, indent=2);
+    info(job_json)
+    info("=====")
+    file_path = Path(file_name)
+    file_dir = file_path.parent
+    subs_dir = file_dir / "subs"
+    out_name = file_path.with_suffix(".transcribe.json")
+    # use subs dir
+    out_file = subs_dir / out_name.name
+    if not subs_dir.exists():
+        subs_dir.mkdir()
+    info(f"Writing done job info to file[{out_file}] ")
+    with open(out_file, "w") as f:
+        f.write(job_json)
+    manifest.record(out_file, directory=directory)
+    info(pformat(job))
+
+
+async def transcribe_all_async(directory, medias, bucket_name, max_jobs, poll_seconds):
+    batch = secondstamp()
+    # the jobs of this batch share the stamp, so they are listed together in each poll
+    tracker = jobs.JobTracker(jobs.TranscribeAdapter(transcribe, batch), min_interval=poll_seconds)
+    running = asyncio.Semaphore(max_jobs)
+
+    async def transcribe_media(i, media):
+        async with running:
+            job_name = f"transcribe__{media.name}__{batch}_{i}"
+            info(f"Starting transcribe job for {media.name}.")
+            if not await asyncio.to_thread(start_transcribe_job, directory, media, bucket_name, job_name):
+                error(f"Failed to start transcribe job for {media.name}.")
+                return "ERROR"
+            job = await tracker.wait(job_name)
+        status = "ERROR"
+        if job:
+            await asyncio.to_thread(write_job, media, job, directory)
+            if job.get("TranscriptionJobStatus") == "COMPLETED":
+                status = "DONE"
+                await asyncio.to_thread(download, media, bucket_name, job, directory)
+        info(f"Transcribe job completed. status[{status}] file[{media.name}] version[{version()}].")
+        return status
 
+    statuses = await asyncio.gather(*(transcribe_media(i, media) for i, media in enumerate(medias)))
+    return dict(zip(medias, statuses))
 
-def fix_terms(file_name, job_info):
+
+def transcribe_all(directory, medias, bucket_name, max_jobs, poll_seconds):
+    """Submits a job per media, up to max_jobs at once, and downloads each result as soon as its job is done."""
+    return asyncio.run(transcribe_all_async(directory, medias, bucket_name, max_jobs, poll_seconds))
+
+
+def fix_terms(file_name, job_info, directory=None):
     file_path = Path(file_name)
     file_dir = file_path.parent
     exists = file_path.exists()
@@ -104,11 +137,13 @@ def fix_terms(file_name, job_info):
     out_path_name = file_path.name.replace(".transcribe.", f".{lang_code}.")
     out_path = file_dir / out_path_name
     terms.fix_terms(file_path, lang_code, out_path)
+    manifest.record(out_path, directory=directory)
     info(f"* Fixed terms in [{file_name}] in [{lang_code}] to [{out_path}]")
+    return out_path
 
 
-def download(file_path, bucket_name, job_info):
-    """Downloads the transcribe results from S3."""
+def download(file_path, bucket_name, job_info, directory=None):
+    """Downloads the transcribe results from S3, returning the term fixed files."""
     job_name = job_info.get('TranscriptionJobName')
     info(f"Downloading transcribes for {job_name} [{type(job_info)}]\n{pformat(job_info)}")
     file_dir = file_path.parent
@@ -119,6 +154,7 @@ def download(file_path, bucket_name, job_info):
     info(f"Subtitles [{type(subs)}]: {subs}")
     sub_uris = subs.get("SubtitleFileUris", [])
     info(f"Downloading [{len(sub_uris)}] subtitles from {job_name}")
+    fixed_files = []
     for uri in sub_uris:
         uri_split = uri.split("/")
         object_prefix = "/".join(uri_split[4:-1])
@@ -130,19 +166,24 @@ def download(file_path, bucket_name, job_info):
         dl_file_out = subs_dir / out_key
         info(f"* Downloading [{uri}] to [{dl_file_out}]")
         get_object(bucket_name, object_prefix, object_key, dl_file_out)
+        manifest.record(dl_file_out, directory=directory)
         info(f"* Fixing [{dl_file_out}]")
         try:
-            fix_terms(dl_file_out, job_info)
+            fixed_file = fix_terms(dl_file_out, job_info, directory)
+            if fixed_file:
+                fixed_files.append(fixed_file)
             info("* Fixed terms.")
         except Exception as e:
             error(f"Failed to fix terms in [{dl_file_out}]: {e}")
         info(f"Downloaded [{uri}] to [{dl_file_out}]")
+    return fixed_files
 
 
 @cmd.cli.command('transcribe')
 @click.option('--directory', default=None, help='Directory to search in')
 @click.option('--bucket_name', default=None, help='Bucket name')
-def command(directory, bucket_name):
+@click.option('--max_jobs', default=None, type=int, help='Maximum number of transcribe jobs running at once')
+def command(directory, bucket_name, max_jobs):
     """Transcribes media files."""
     bucket_name = resolve(Config.BUCKET_NAME, bucket_name)
     directory = resolve(Config.MEDIA_PATH, directory)
@@ -153,18 +194,7 @@ def command(directory, bucket_name):
         return
     synced_media_files = sync_res.get('synced_medias')
     info(f"Found {len(synced_media_files)} synced medias to transcribe.")
-    for media in synced_media_files:
-        file_name = media.name
-        job_name = f"transcribe__{file_name}__{secondstamp()}"
-        info(f"Starting transcribe job for {file_name}.")
-        job_info = start_transcribe_job(directory, media, bucket_name, job_name)
-        if not job_info:
-            error(f"Failed to start transcribe job for {file_name}.")
-            continue
-        info("Transcription job started.")
-        done_job = wait_job_done(media, job_name)
-        status = "ERROR"
-        if done_job:
-            status = "DONE"
-            download(media, bucket_name, done_job)
-        info(f"Transcribe job completed. status[{status}] file[{file_name}] version[{version()}].")
+    max_jobs = resolve(Config.TRANSCRIBE_MAX_JOBS, max_jobs)
+    poll_seconds = resolve(Config.TRANSCRIBE_POLL_SECONDS)
+    results = transcribe_all(directory, synced_media_files, bucket_name, max_jobs, poll_seconds)
+    info(pformat({str(media): status for media, status in results.items()}))
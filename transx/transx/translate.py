@@ -1,13 +1,11 @@
 import click
 from pprint import pformat
 from .utils import *
-from . import cmd, sync
-from tenacity import retry, wait_exponential, stop_after_delay
-from datetime import datetime
+from . import cmd, sync, jobs, aws, manifest
 import time
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 
-translate = boto3.client('translate')
+translate = aws.LazyClient('translate')
 
 
 def transcribe_key(file_path, job_name):
@@ -63,30 +61,17 @@ def start_translate_job(translate_prefix, bucket_name, job_name):
         return None
 
 
-_done_status = ["COMPLETED", "COMPLETED_WITH_ERROR", "FAILED", "STOPPED", "STOP_REQUESTED"]
-
-
-@retry(wait=wait_exponential(multiplier=1.5, min=30, max=2*60), stop=stop_after_delay(60*60))
-def wait_job_done(subtitle_prefix, job_info):
-    """Polls the translate job status until completion or failure."""
+def wait_job_done(subtitle_prefix, job_info, tracker=None):
+    """Polls the translate job status until completion or failure, on the tracker loop if given."""
     job_id = job_info.get('JobId')
-    try:
-        resp = translate.describe_text_translation_job(JobId=job_id)
-        props = resp.get("TextTranslationJobProperties")
-        status = props.get("JobStatus")
-        now_str = datetime.isoformat(datetime.now())
-        info(f"Current status of job {job_id}: {status} {now_str}")
-        if status in _done_status:
-            job_pp = pformat({}, indent=2)
-            info(job_pp)
-            return props
-        raise Exception(f"Translation job {job_id} done yet.")
-    except ClientError as e:
-        error(f"Error fetching job status for {job_id}: {e}")
-        return None
+    adapter = jobs.TranslateAdapter(translate)
+    if tracker:
+        return tracker.wait(adapter, job_id)
+    return jobs.wait(adapter, job_id)
 
 
-def s3_download_all(directory, output_s3_url):
+def s3_download_all(directory, output_s3_url, root=None):
+    """Downloads the objects under the url to the directory, recorded in the manifest of the root being processed."""
     if output_s3_url.startswith("s3://"):
         output_s3_url = output_s3_url[5:]
     bucket_name, prefix = output_s3_url.split('/', 1) if '/' in output_s3_url else (output_s3_url, '')
@@ -95,28 +80,8 @@ def s3_download_all(directory, output_s3_url):
     if prefix and not prefix.endswith('/'):
         prefix += '/'
 
-    # Create the directory if it does not exist
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-    # List objects within the S3 bucket
-    paginator = s3.get_paginator('list_objects_v2')
-
     try:
-        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
-            for obj in page.get('Contents', []):
-                # Construct the path to save the file
-                file_path = os.path.join(directory, obj['Key'][len(prefix):])
-                file_dir = os.path.dirname(file_path)
-
-                # Create directory structure if it does not exist
-                if not os.path.exists(file_dir):
-                    os.makedirs(file_dir)
-
-                # Download the file
-                s3.download_file(bucket_name, obj['Key'], file_path)
-                info(f"Downloaded {obj['Key']} to {file_path}")
-
+        manifest.record(*s3_download_objects(bucket_name, prefix, directory), directory=root)
     except NoCredentialsError:
         info("Error: No AWS credentials were found.")
     except PartialCredentialsError:
@@ -125,7 +90,7 @@ def s3_download_all(directory, output_s3_url):
         info(f"An error occurred: {e}")
 
 
-def download(directory, job_info):
+def download(directory, job_info, root=None):
     """Downloads the translate results from S3."""
     info(f"Downloading translate results.\n {job_info} ")
     output_config = job_info.get("OutputDataConfig")
@@ -133,7 +98,7 @@ def download(directory, job_info):
     directory_path = Path(directory)
     parent_path = directory_path.parent
     output_dir = parent_path / "subtitles"
-    s3_download_all(output_dir, output_s3_url)
+    s3_download_all(output_dir, output_s3_url, root)
     info(f"Downloaded translate results to {output_dir}.")
 
 
@@ -173,5 +138,5 @@ def command(directory, bucket_name):
         if done_job:
             status = "DONE"
             write_translate_job(subtitle_prefix, done_job)
-            download(subtitle_prefix, done_job)
+            download(subtitle_prefix, done_job, directory)
         info(f"Transcribe job completed. status[{status}] dir[{subtitle_prefix}].")
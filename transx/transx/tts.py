@@ -1,124 +1,125 @@
 import click
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from pprint import pformat
+from urllib.parse import urlparse, unquote
 from .utils import *
-from . import cmd, sync
-from tenacity import retry, wait_exponential, stop_after_attempt
-from datetime import datetime
-import time
+from . import cmd, jobs, aws, manifest, ssml
 
-polly = boto3.client('polly')
+polly = aws.LazyClient('polly')
 
+# polly language and voice for each language
+VOICES = {
+    "en": ("en-US", "Joanna"),
+    "en-GB": ("en-GB", "Amy"),
+    "pt": ("pt-BR", "Camila"),
+    "pt-PT": ("pt-PT", "Ines"),
+    "es": ("es-US", "Lupe"),
+    "es-ES": ("es-ES", "Lucia"),
+    "ca": ("ca-ES", "Arlet"),
+    "fr": ("fr-FR", "Lea"),
+    "it": ("it-IT", "Bianca"),
+    "de": ("de-DE", "Vicki"),
+}
 
-def transcribe_key(file_path, job_name):
-    key = file_key(file_path)
-    return f"{key}/transcribe/{job_name}/"
 
+def voice_of(lang_code):
+    """Polly language code and voice of a language, falling back to its base language."""
+    lang_code = lang_code.replace("_", "-")
+    return VOICES.get(lang_code) or VOICES.get(lang_code.split("-")[0].lower())
 
-def start_tts_job(tts_prefix, bucket_name, job_name):
-    """Starts a tts job for the specified dir."""
-    job_info = {
-        'JobName': job_name,
-        'TranslatePrefix': tts_prefix,
-    }
-    pretty_job_info = pformat(job_info)
-    info(f"Starting tts job.\n{pretty_job_info}")
-    input_key = s3_key("user", tts_prefix)
-    input_uri = s3_url_abs(bucket_name, input_key)
-    output_uri = s3_url_abs(bucket_name, "tts", job_name)
-    role_arn = check_role()
-    src_lang = resolve(Config.TRANSX_SOURCE_LANG)
-    tgt_lang_str = resolve(Config.TRANSX_TARGET_LANG)
-    tgt_langs = tgt_lang_str.split(",")
-    job_info = {
-        'JobName': job_name,
-        'InputUri': input_uri,
-        'OutputUri': output_uri,
-        'DataAccessRoleArn': role_arn,
-        'SourceLanguageCode': src_lang,
-        'TargetLanguageCodes': tgt_langs
-    }
-    pretty_job_info = pformat(job_info)
-    info(f"Starting tts job.\n{pretty_job_info}")
+
+def start_tts_task(directory, ssml_file, lang_code, bucket_name, batch, client=None):
+    """Starts a speech synthesis task for the SSML file, returning its task id."""
+    voice = voice_of(lang_code)
+    if not voice:
+        warning(f"No polly voice for [{lang_code}], skipping [{ssml_file}]")
+        return None
+    language_code, voice_id = voice
+    relative_path = ssml_file.relative_to(directory).with_suffix("")
+    # polly appends the task id and the format to the prefix
+    output_prefix = s3_key("tts", batch, str(relative_path))
+    with open(ssml_file, "r") as f:
+        text = f.read()
     try:
-        resp = tts.start_text_translation_job(
-            JobName=job_name,
-            InputDataConfig={
-                'S3Uri': input_uri,
-                'ContentType': 'text/plain'
-            },
-            OutputDataConfig={
-                'S3Uri': output_uri
-            },
-            DataAccessRoleArn=role_arn,
-            SourceLanguageCode=src_lang,
-            TargetLanguageCodes=tgt_langs
-        )
-        job_id = resp['JobId']
-        job_info['JobId'] = job_id
-        return job_info
+        resp = (client or polly).start_speech_synthesis_task(
+            Engine=resolve(Config.TTS_ENGINE),
+            LanguageCode=language_code,
+            VoiceId=voice_id,
+            OutputFormat=resolve(Config.TTS_FORMAT),
+            OutputS3BucketName=bucket_name,
+            OutputS3KeyPrefix=output_prefix,
+            Text=text,
+            TextType='ssml')
+        task_id = resp['SynthesisTask']['TaskId']
+        info(f"Started tts task {task_id} for [{ssml_file.name}] with voice [{voice_id}]")
+        return task_id
     except ClientError as e:
-        error(f"Failed to start tts job for {dir}: {e}")
+        error(f"Failed to start tts task for {ssml_file}: {e}")
         return None
 
 
-_done_status = ["COMPLETED", "COMPLETED_WITH_ERROR", "FAILED", "STOPPED", "STOP_REQUESTED"]
+def output_key(task, bucket_name):
+    """Key of the audio of a done task, from its output uri."""
+    url = urlparse(task['OutputUri'])
+    key = unquote(url.path.lstrip("/"))
+    if not url.netloc.startswith(bucket_name + "."):
+        # path style uri, the bucket comes first
+        key = key.split("/", 1)[1]
+    return key
 
 
-@retry(wait=wait_exponential(multiplier=2, min=30, max=60 * 60), stop=stop_after_attempt(30))
-def wait_job_done(subtitle_prefix, job_info):
-    """Polls the tts job status until completion or failure."""
-    job_id = job_info.get('JobId')
-    try:
-        resp = tts.describe_text_translation_job(JobId=job_id)
-        props = resp.get("TextTranslationJobProperties")
-        status = props.get("JobStatus")
-        now_str = datetime.isoformat(datetime.now())
-        info(f"Current status of job {job_id}: {status} {now_str}")
-        if status in _done_status:
-            job_pp = pformat({}, indent=2)
-            info(job_pp)
-            return props
-        raise Exception(f"Translation job {job_id} done yet.")
-    except ClientError as e:
-        error(f"Error fetching job status for {job_id}: {e}")
-        return None
+def download(bucket_name, key, audio_file, client=None):
+    """Downloads the tts result from S3."""
+    (client or s3).download_file(bucket_name, key, str(audio_file))
+    info(f"Downloaded [{key}] to [{audio_file}]")
+    return audio_file
 
 
-def download(file_path, bucket_name, job_info):
-    """Downloads the tts results from S3."""
-    info(f"Downloading tts results. {job_info} ")
+def run(directory, bucket_name, file_index=None, max_jobs=None, poll_seconds=None, polly_client=None, s3_client=None):
+    """Synthesizes the SSML of every VTT file, with all the tasks started and polled together."""
+    directory = Path(resolve(Config.MEDIA_PATH, directory))
+    bucket_name = resolve(Config.BUCKET_NAME, bucket_name)
+    max_jobs = resolve(Config.TTS_JOBS, max_jobs)
+    audio_format = resolve(Config.TTS_FORMAT)
+    batch = secondstamp()
+    reports = ssml.run(directory, file_index)
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        starts = [(Path(report["ssml"]), executor.submit(start_tts_task, directory, Path(report["ssml"]),
+                                                         report["lang_code"], bucket_name, batch, polly_client))
+                  for report in reports]
+        tasks = {future.result(): ssml_file for ssml_file, future in starts if future.result()}
+    info(f"Started {len(tasks)} tts tasks for {len(reports)} SSML files.")
+    adapter = jobs.PollyAdapter(polly_client or polly)
+    done_tasks = jobs.wait_all(adapter, list(tasks), min_interval=poll_seconds)
+    statuses = {str(ssml_file): "not started" for ssml_file, _ in starts}
+    downloads = []
+    for task_id, ssml_file in tasks.items():
+        task = done_tasks.get(task_id)
+        status = task.get('TaskStatus') if task else "timed out"
+        statuses[str(ssml_file)] = status
+        if status == "completed":
+            downloads.append((output_key(task, bucket_name), ssml_file.with_suffix("." + audio_format)))
+        else:
+            error(f"TTS task {task_id} for [{ssml_file}] {status}: {task and task.get('TaskStatusReason')}")
+    download_jobs = resolve(Config.DOWNLOAD_JOBS)
+    with ThreadPoolExecutor(max_workers=download_jobs) as executor:
+        futures = [executor.submit(download, bucket_name, key, audio_file, s3_client) for key, audio_file in downloads]
+        audio_files = [future.result() for future in futures]
+    manifest.record(*audio_files, directory=directory)
+    return {
+        "batch": batch,
+        "started": len(tasks),
+        "downloaded": len(audio_files),
+        "files": statuses,
+    }
 
 
 @cmd.cli.command('tts')
 @click.option('--directory', default=None, help='Directory to search in')
 @click.option('--bucket_name', default=None, help='Bucket name')
-def command(directory, bucket_name):
-    """Transcribes all audio files in the specified directory matching the glob pattern."""
-    bucket_name = resolve(Config.TRANSX_BUCKET_NAME, bucket_name)
-    directory = resolve(Config.TRANSX_PATH, directory)
-    sync_res = sync.run(directory, bucket_name)
-    sync_ok = sync_res.get('status') == 'ok'
-    if not sync_ok:
-        error("Failed to sync files.")
-        return
-    subtitle_prefixes = sync_res.get('subtitle_prefixes')
-    info(f"Found {len(subtitle_prefixes)} synced dirs to transcribe.")
-    for subtitle_prefix in subtitle_prefixes:
-        subtitle_prefix_id = subtitle_prefix.replace("/", "_")
-        job_name = f"tts__{subtitle_prefix_id}__{secondstamp()}"
-        info(f"Starting tts job for {subtitle_prefix}.")
-        job_info = start_tts_job(subtitle_prefix, bucket_name, job_name)
-        if not job_info:
-            error(f"Failed to start tts job for {subtitle_prefix}.")
-            continue
-        info("TTS job started.")
-        t0 = time.time()
-        done_job = wait_job_done(subtitle_prefix, job_info)
-        t1 = time.time()
-        minutes = (t1 - t0) / 60.0
-        info(f"TTS job completed in {minutes} minutes.")
-        status = "ERROR"
-        if done_job:
-            status = "DONE"
-            download(subtitle_prefix, bucket_name, job_info)
-        info(f"TTS job completed. status[{status}] dir[{subtitle_prefix}].")
+@click.option('--max_jobs', default=None, type=int, help='Number of tts tasks to start concurrently')
+def command(directory, bucket_name, max_jobs):
+    """Synthesizes speech for all the subtitles in the directory."""
+    result = run(directory, bucket_name, max_jobs=max_jobs)
+    info(pformat(result))
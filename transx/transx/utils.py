@@ -5,17 +5,14 @@ from datetime import datetime
 import json
 from .logs import *
 from botocore.exceptions import ClientError
-import boto3
+from concurrent.futures import ThreadPoolExecutor
 from .config import *
+from .etags import calc_etags, candidate_part_sizes
+from .about import semver, version
+from . import aws
 
-semver = "0.0.1"
-
-s3 = boto3.client('s3')
-iam = boto3.client('iam')
-
-
-def version():
-    return semver
+s3 = aws.LazyClient('s3')
+iam = aws.LazyClient('iam')
 
 
 def system_id():
@@ -102,6 +99,46 @@ def get_object(bucket, prefix, file_name, output_file=None):
         error(f"Download failed for [{object_url}]: {e}")
 
 
+def is_downloaded(file_path, etag, size):
+    """Check if the local file already has the size and ETag of the S3 object."""
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) != size:
+        return False
+    etag = etag.strip('"')
+    part_sizes = candidate_part_sizes(etag, size)
+    return etag in calc_etags(file_path, part_sizes).values()
+
+
+def s3_download_objects(bucket_name, prefix, directory, jobs=None):
+    """Downloads all objects under the prefix to the directory concurrently, skipping the ones already downloaded.
+
+    Returns the local paths of all the objects, downloaded now or before.
+    """
+    jobs = resolve(Config.DOWNLOAD_JOBS, jobs)
+    downloads = []
+    skipped = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            file_path = os.path.join(directory, obj['Key'][len(prefix):])
+            if is_downloaded(file_path, obj['ETag'], obj['Size']):
+                debug(f"Skipping {obj['Key']}, already downloaded to {file_path}")
+                skipped.append(file_path)
+                continue
+            downloads.append((obj['Key'], file_path))
+    info(f"Downloading {len(downloads)} objects from s3://{bucket_name}/{prefix} to {directory}")
+    for file_dir in set(os.path.dirname(file_path) for _, file_path in downloads):
+        os.makedirs(file_dir, exist_ok=True)
+
+    def download(key, file_path):
+        s3.download_file(bucket_name, key, file_path)
+        info(f"Downloaded {key} to {file_path}")
+        return file_path
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(download, key, file_path) for key, file_path in downloads]
+        return skipped + [future.result() for future in futures]
+
+
 def role_exists(role_name):
     if not role_name:
         return False
@@ -169,5 +206,12 @@ def check_role():
     return None
 
 
+def state_path(directory, name):
+    """Path of a transx state file kept under the media directory."""
+    state_dir = Path(directory) / Config.STATE_DIR.resolve()
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir / name
+
+
 def resolve(config, default_val=None):
     return config.resolve(default_val)
@@ -1,25 +1,38 @@
 import click
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pprint import pformat
 from .files import *
 from .config import Config
-from . import cmd
+from . import cmd, manifest
+from .etags import WHOLE_FILE, etag_cache, local_etags
+from .store import JsonStore, FileStore, shared_store
 import vimeo
+from tusclient import client as tus
+from tusclient.exceptions import TusCommunicationError
 
 vimeo_cli = None
 
+# results per page of vimeo listings, the most it allows
+PAGE_SIZE = 100
+
 
 def vimeo_client():
+    global vimeo_cli
     if vimeo_cli:
         return vimeo_cli
     _client_id = Config.VIMEO_CLIENT_ID.resolve()
     _access_token = Config.VIMEO_ACCESS_TOKEN.resolve()
     _client_secret = Config.VIMEO_CLIENT_SECRET.resolve()
-    _vimeo_cli = vimeo.VimeoClient(
+    vimeo_cli = vimeo.VimeoClient(
         token=_access_token,
         key=_client_id,
         secret=_client_secret
     )
-    return _vimeo_cli
+    vimeo_cli.API_ROOT = Config.VIMEO_API_URL.resolve()
+    return vimeo_cli
 
 
 def vimeo_user_id():
@@ -30,51 +43,407 @@ def vimeo_user_id():
     return user_id
 
 
+class RateLimiter:
+    """Token bucket spending the vimeo API budget, paced by its X-RateLimit headers.
+
+    Requests take tokens refilled at `rate` per second, up to `burst`. When vimeo reports
+    that its budget is down to `reserve` requests, or answers 429, all the callers wait
+    together until the budget resets.
+    """
+
+    # wait on a 429 without a reset time
+    DEFAULT_BACKOFF = 60
+
+    def __init__(self, rate=None, burst=None, reserve=None):
+        self.rate = Config.VIMEO_RATE.resolve(rate)
+        self.burst = Config.VIMEO_BURST.resolve(burst)
+        self.reserve = Config.VIMEO_RATE_RESERVE.resolve(reserve)
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.remaining = None
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+        self.waits = 0
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def acquire(self):
+        """Blocks until a request fits in the budget."""
+        with self.cond:
+            while True:
+                self._refill()
+                now = time.time()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                    warning(f"Vimeo rate limit exceeded, waiting {wait:.1f}s")
+                elif self.remaining is not None and self.remaining <= self.reserve and now < self.reset_at:
+                    wait = self.reset_at - now
+                    warning(f"Vimeo rate limit budget at [{self.remaining}], waiting {wait:.1f}s for its reset")
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                self.waits += 1
+                self.cond.wait(wait)
+
+    def observe(self, response, *args, **kwargs):
+        """Reads the budget left from a response, as a requests response hook."""
+        headers = response.headers
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        with self.cond:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset:
+                self.reset_at = datetime.fromisoformat(reset).timestamp()
+            if response.status_code == 429:
+                self.remaining = 0
+                retry_after = headers.get("Retry-After")
+                if retry_after:
+                    self.reset_at = time.time() + float(retry_after)
+                elif not reset:
+                    self.reset_at = time.time() + self.DEFAULT_BACKOFF
+                self.blocked_until = self.reset_at
+            self.cond.notify_all()
+        return response
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def rate_limiter():
+    global _limiter
+    with _limiter_lock:
+        if not _limiter:
+            _limiter = RateLimiter()
+    return _limiter
+
+
+def api(method, request_url, retries=3, **kwargs):
+    """Calls the vimeo API within its rate limit, retrying the requests answered with 429."""
+    # upload links live on other hosts, outside of the API budget
+    if request_url.startswith(("http://", "https://")) and not request_url.startswith(Config.VIMEO_API_URL.resolve()):
+        return getattr(vimeo_client(), method)(request_url, **kwargs)
+    limiter = rate_limiter()
+    kwargs['hooks'] = {'response': limiter.observe}
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return getattr(vimeo_client(), method)(request_url, **kwargs)
+        except vimeo.exceptions.APIRateLimitExceededFailure as e:
+            if attempt == retries:
+                raise
+            warning(f"Vimeo rate limit exceeded on [{request_url}], retrying: {e}")
+
+
+def get_all(request_url):
+    """All the items of a vimeo listing, following its pages, or None if it fails."""
+    items = []
+    params = {"per_page": PAGE_SIZE}
+    while request_url:
+        response = api("get", request_url, params=params)
+        if response.status_code != 200:
+            warning(f"Failed to list [{request_url}]: {response.status_code}")
+            return None
+        body = response.json()
+        items.extend(body.get('data') or [])
+        # the next page url already has the query
+        request_url = (body.get('paging') or {}).get('next')
+        params = None
+    debug(f"Listed [{len(items)}] items")
+    return items
+
+
+def video_id(vimeo_url):
+    return vimeo_url.split('/')[-1]
+
+
+class VimeoState:
+    """Folders, videos and text tracks of the vimeo account, listed once per run and kept up to date as transx creates them.
+
+    Each listing runs once, under a lock of its own, while the lookups of the other keys go on.
+    The state lock only guards the dicts, never a vimeo call, which may wait minutes for the rate limit.
+    """
+
+    def __init__(self, directory=None):
+        # the state files of the run are kept in the state dir of its directory
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.projects = None
+        self.folder_items = {}
+        self.texttracks = {}
+        self.key_locks = {}
+
+    def key_lock(self, key):
+        """The lock of one key of the state, shared by the threads working on it."""
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _load_once(self, key, is_loaded, load):
+        """Whether the key is loaded, loading it if no other thread did, without holding the state lock."""
+        with self.lock:
+            if is_loaded():
+                return True
+        with self.key_lock(key):
+            with self.lock:
+                if is_loaded():
+                    return True
+            return load()
+
+    def folder(self, folder_name):
+        if not self._load_once("projects", lambda: self.projects is not None, self._load_projects):
+            return None
+        with self.lock:
+            return self.projects.get(folder_name)
+
+    def _load_projects(self):
+        projects = get_all(f'/users/{vimeo_user_id()}/projects')
+        if projects is None:
+            return False
+        by_name = {}
+        for project in projects:
+            # the first folder wins when names repeat, as vimeo lists them
+            by_name.setdefault(project.get('name'), project)
+        with self.lock:
+            self.projects = by_name
+        return True
+
+    def add_folder(self, project):
+        with self.lock:
+            if self.projects is not None:
+                self.projects[project.get('name')] = project
+            self.folder_items.setdefault(project.get('uri'), {})
+
+    def video(self, folder_uri, video_name):
+        if not self._load_once(("items", folder_uri), lambda: folder_uri in self.folder_items,
+                               lambda: self._load_videos(folder_uri)):
+            return None
+        with self.lock:
+            return self.folder_items[folder_uri].get(video_name)
+
+    def _load_videos(self, folder_uri):
+        items = get_all(f'{folder_uri}/items')
+        if items is None:
+            return False
+        videos = {item['video'].get('name'): item['video'] for item in items if item.get('type') == 'video'}
+        info(f"Found [{len(videos)}] videos in project [{folder_uri}].")
+        with self.lock:
+            self.folder_items[folder_uri] = videos | self.folder_items.get(folder_uri, {})
+        return True
+
+    def add_video(self, folder_uri, video):
+        with self.lock:
+            self.folder_items.setdefault(folder_uri, {})[video.get('name')] = video
+
+    def tracks(self, vimeo_url):
+        vid = video_id(vimeo_url)
+        if not self._load_once(("tracks", vid), lambda: vid in self.texttracks, lambda: self._load_tracks(vid)):
+            return []
+        with self.lock:
+            return list(self.texttracks[vid])
+
+    def _load_tracks(self, vid):
+        tracks = get_all(f'/videos/{vid}/texttracks')
+        if tracks is None:
+            return False
+        with self.lock:
+            self.texttracks[vid] = tracks + self.texttracks.get(vid, [])
+        return True
+
+    def content_lock(self, content_key):
+        """Lock held while a content is looked up and published, so its copies reuse the same video."""
+        return self.key_lock(("content", content_key))
+
+    def add_track(self, vimeo_url, track, replaces=None):
+        with self.lock:
+            tracks = self.texttracks.setdefault(video_id(vimeo_url), [])
+            if replaces:
+                tracks[:] = [t for t in tracks if t.get('uri') != replaces]
+            tracks.append(track)
+
+
+_state = None
+
+
+def vimeo_state():
+    global _state
+    if not _state:
+        _state = VimeoState()
+    return _state
+
+
+def reset_state(directory=None):
+    """Starts a new run of the directory, listing the vimeo account again on the next lookups."""
+    global _state
+    _state = VimeoState(directory)
+    return _state
+
+
+def ensure_folder(folder_name, parent_folder_uri=None):
+    """The folder, created when missing only once, even if its videos sync concurrently."""
+    with vimeo_state().key_lock(("folder", folder_name)):
+        folder = get_folder(folder_name)
+        if not folder:
+            debug(f"Creating vimeo folder [{folder_name}]")
+            create_folder(folder_name, parent_folder_uri)
+            folder = get_folder(folder_name)
+    return folder
+
+
 def get_folder(data_folder_name):
-    v = vimeo_client()
     user_id = vimeo_user_id()
-    request_url = f'/users/{user_id}/projects'
     debug(f"Get folder [{user_id}]/{data_folder_name}")
-    response = v.get(request_url)
-    if response.status_code == 200:
-        projects = response.json().get('data')
-        for project in projects:
-            if project.get('name') == data_folder_name:
-                info(f"Folder [{data_folder_name}] found for user [{user_id}]")
-                return project
-        info(f"Folder [{data_folder_name}] not found for user [{user_id}]")
-        return None
+    project = vimeo_state().folder(data_folder_name)
+    if project:
+        info(f"Folder [{data_folder_name}] found for user [{user_id}]")
     else:
-        warning("Failed to get projects:", response.json())
-        return None
+        info(f"Folder [{data_folder_name}] not found for user [{user_id}]")
+    return project
 
 
-def vimeo_upload(file_path, folder_uri):
-    try:
-        #
-        # Upload the video
-        info(f"Uploading {file_path.name} to [{folder_uri}]")
-        video_name = file_path.name
-        body = {
-            'name': video_name,
-            'description': video_name
+class UploadJournal(FileStore):
+    """Persistent upload links and acknowledged offsets of the unfinished uploads, keyed by file path, size and mtime."""
+
+    name = "upload journal"
+
+
+class VideoIndex(JsonStore):
+    """Persistent map of the content of the published videos, by ETag and size, to their vimeo video."""
+
+    name = "video index"
+
+    def put(self, content_key, video_uri, file_path, folder_uri=None):
+        super().put(content_key, {'uri': video_uri, 'name': file_path.name, 'folder_uri': folder_uri})
+
+
+def state_root(file_path):
+    """The dir keeping the state of the file, the same for all the files of the directory of the run."""
+    return manifest.find_root(file_path, vimeo_state().directory)
+
+
+def state_file(file_path, name, factory):
+    """The state kept in a file of the state dir of the file, loaded once."""
+    return shared_store(state_path(state_root(file_path), name), factory)
+
+
+def upload_journal(file_path):
+    return state_file(file_path, "vimeo_uploads.json", UploadJournal)
+
+
+def video_index(file_path):
+    return state_file(file_path, "vimeo_videos.json", VideoIndex)
+
+
+def content_key(file_path):
+    """The ETag and size of the file, as sync computes and caches them for its S3 upload."""
+    size = os.path.getsize(file_path)
+    part_size = Config.TRANSFER_CHUNK_SIZE.resolve()
+    if size < part_size:
+        part_size = WHOLE_FILE
+    cache = etag_cache(state_path(state_root(file_path), "etags.json"))
+    etag = local_etags(file_path, [part_size], cache)[part_size]
+    cache.save()
+    return f"{etag}/{size}"
+
+
+class UploadResult:
+    """Outcome of a video upload, with the video uri when it succeeded or the error when it failed."""
+
+    def __init__(self, file_path, video_uri=None, error=None, resumed_from=0, sent=0):
+        self.file_path = file_path
+        self.video_uri = video_uri
+        self.error = error
+        self.resumed_from = resumed_from
+        self.sent = sent
+
+    @property
+    def ok(self):
+        return self.error is None and self.video_uri is not None
+
+    @property
+    def video_url(self):
+        return f"https://vimeo.com{self.video_uri}" if self.video_uri else None
+
+    def __repr__(self):
+        if self.ok:
+            return f"UploadResult({self.file_path.name}, ok, {self.video_uri}, sent={self.sent})"
+        return f"UploadResult({self.file_path.name}, failed, {self.error})"
+
+
+def tus_uploader(fs, upload_link):
+    """A tus uploader at the offset the server acknowledged for the upload link."""
+    chunk_size = Config.VIMEO_CHUNK_SIZE.resolve()
+    return tus.TusClient(upload_link).uploader(
+        file_stream=fs,
+        url=upload_link,
+        chunk_size=chunk_size,
+        retries=3)
+
+
+def create_upload(file_path, folder_uri):
+    """Creates the video and its tus upload, returning the video uri and upload link."""
+    video_name = file_path.name
+    body = {
+        'name': video_name,
+        'description': video_name,
+        'upload': {
+            'approach': 'tus',
+            'size': file_path.stat().st_size
         }
-        if folder_uri:
-            body['folder_uri'] = folder_uri
-        video_uri = vimeo_client().upload(file_path, data=body)
-        if video_uri:
-            # Get the video URL
-            video_url = f"https://vimeo.com{video_uri}"
-            info(f"Video uploaded successfully! Video URL: {video_url}")
-            return video_url
-        else:
-            info("Failed to upload the video. No video URI returned.")
-            return None
+    }
+    if folder_uri:
+        body['folder_uri'] = folder_uri
+    attempt = api("post", "/me/videos", data=body, params={'fields': 'uri,upload'})
+    if attempt.status_code != 200:
+        raise vimeo.exceptions.UploadAttemptCreationFailure(attempt, "Unable to initiate an upload attempt.")
+    attempt = attempt.json()
+    return attempt['uri'], attempt['upload']['upload_link']
+
 
-    except vimeo.exceptions.VideoUploadFailure as e:
-        return f"Video upload failed: {e}"
+def vimeo_upload(file_path, folder_uri):
+    """Uploads the video, resuming from the last acknowledged byte of an earlier attempt."""
+    info(f"Uploading {file_path.name} to [{folder_uri}]")
+    journal = upload_journal(file_path)
+    try:
+        with open(file_path, 'rb') as fs:
+            uploader = None
+            pending = journal.get(file_path)
+            if pending:
+                try:
+                    uploader = tus_uploader(fs, pending['upload_link'])
+                    video_uri = pending['video_uri']
+                    info(f"Resuming upload of {file_path.name} at byte [{uploader.offset}] of [{pending['size']}]")
+                except TusCommunicationError as e:
+                    warning(f"Upload of {file_path.name} can not be resumed, starting over: {e}")
+            if not uploader:
+                video_uri, upload_link = create_upload(file_path, folder_uri)
+                journal.put(file_path, video_uri=video_uri, upload_link=upload_link, folder_uri=folder_uri, offset=0)
+                uploader = tus_uploader(fs, upload_link)
+            resumed_from = uploader.offset
+            while uploader.offset < uploader.stop_at:
+                uploader.upload_chunk()
+                journal.put(file_path, offset=uploader.offset)
+                debug(f"Uploaded [{uploader.offset}/{uploader.stop_at}] bytes of {file_path.name}")
     except Exception as e:
-        return f"An error occurred: {e}"
+        error(f"Video upload of {file_path.name} failed: {e}")
+        return UploadResult(file_path, error=str(e))
+    journal.remove(file_path)
+    vimeo_state().add_video(folder_uri, {
+        'uri': video_uri,
+        'name': file_path.name,
+        'metadata': {'connections': {'texttracks': {'uri': f"{video_uri}/texttracks"}}},
+    })
+    result = UploadResult(file_path, video_uri, resumed_from=resumed_from, sent=uploader.stop_at - resumed_from)
+    info(f"Video uploaded successfully! Video URL: {result.video_url}")
+    return result
 
 
 def get_video(file_path, project_url):
@@ -84,30 +453,14 @@ def get_video(file_path, project_url):
     video_name = file_path.name
     info(f"Checking if video file [{video_name}] is synced in [{project_url}].")
     # check if there is a video with same name
-    v = vimeo_client()
-    request_url = f'{project_url}/items'
-    response = v.get(request_url)
-    if response.status_code == 200:
-        data = response.json().get('data')
-        videos = list(filter(lambda x: x.get('type') == 'video', data))
-        info(f"Found [{len(videos)}] videos in project [{project_url}].")
-        for v in videos:
-            video_el = v.get("video")
-            v_name = video_el.get('name')
-            matches = v_name == video_name
-            debug(f"== Matching [{v_name}]x[{video_name}] => {matches}")
-            if matches:
-                debug(f"{pformat(video_el)}")
-                debug(f"Video {video_name} found with uri[{video_el.get("uri")}].")
-                return video_el
-        return None
-    else:
-        info("Failed to get videos:", response.json())
-    return None
+    video_el = vimeo_state().video(project_url, video_name)
+    if video_el:
+        debug(f"{pformat(video_el)}")
+        debug(f"Video {video_name} found with uri[{video_el.get("uri")}].")
+    return video_el
 
 
 def vimeo_move(vimeo_url, data_folder):
-    v = vimeo_client()
     user_id = Config.VIMEO_USER_ID.resolve()
     if not data_folder:
         info("No data_folder provided.")
@@ -117,7 +470,7 @@ def vimeo_move(vimeo_url, data_folder):
     data_folder_id = data_folder_uri.split("/")[-1]
     video_id = vimeo_url.split("/")[-1]
     request_url = f'/users/{user_id}/projects/{data_folder_id}/videos/{video_id}'
-    response = v.put(request_url, data={})
+    response = api("put", request_url, data={})
     if response.status_code == 204:
         info(f"Video moved to data_folder[{data_folder_name}]")
         return True
@@ -127,8 +480,6 @@ def vimeo_move(vimeo_url, data_folder):
 
 
 def create_folder(data_folder_name, parent_folder_uri=None):
-    v = vimeo_client()
-
     user_id = Config.VIMEO_USER_ID.resolve()
     request_url = f'/users/{user_id}/projects'
     body = {
@@ -136,10 +487,12 @@ def create_folder(data_folder_name, parent_folder_uri=None):
     }
     if parent_folder_uri:
         body['parent_folder_uri'] = parent_folder_uri
-    response = v.post(request_url, data=body)
+    response = api("post", request_url, data=body)
     if response.status_code == 201:
-        folder_uri = response.json().get('uri')
-        info(f"Folder [{data_folder_name}] created at [{folder_uri}]", response.json())
+        project = response.json()
+        folder_uri = project.get('uri')
+        vimeo_state().add_folder(project)
+        info(f"Folder [{data_folder_name}] created at [{folder_uri}]")
         return folder_uri
     else:
         info("Failed to create folder:", response.json())
@@ -178,8 +531,8 @@ def find_subs(file_path):
     dirs = [subtitles_dir, subs_dir]
     subs = []
     for adir in dirs:
-        if not subs_dir.exists():
-            info(f"Subtitles dir not found in {subs_dir}")
+        if not adir.is_dir():
+            debug(f"Subtitles dir not found in {adir}")
             continue
         for sub_file in adir.iterdir():
             if is_sub_file(file_path, sub_file):
@@ -189,148 +542,153 @@ def find_subs(file_path):
     return subs
 
 
-def vimeo_upload_sub(video, vimeo_url, sub, data_folder_uri, lang_code):
-    # try:
-    #
-    # Upload the video
-    info(f"Uploading {sub} to video {vimeo_url}")
-    video_data = get_video(video, data_folder_uri)
-    video_uri = video_data.get("uri")
-    metadata = video_data.get("metadata", {})
-    connections = metadata.get("connections", {})
-    texttracks = connections.get("texttracks", {})
-    tracks_uri = texttracks.get("uri")
-    if not tracks_uri:
-        warning(f"URI not found for texttracks of {video_uri}")
-    v = vimeo_client()
-    info(f"Creating text tracks resource [{tracks_uri}]")
-    body = {
-      "type": f"{"subtitles"}",
-      "language": f"{lang_code}",
-      "name": f"{sub.name}"
-    }
-    res = v.post(tracks_uri, data=body)
-    if res.status_code == 201:
-        data = res.json() #.get('data', {})
-        link = data.get("link")
-        info(f"Subtitle creation success [{link}]")
-        put_res = v.put(link, sub)
-        if put_res.status_code == 200:
-            info("Subtitle PUT success")
-            put_data = put_res.json().get('data')
-            sub_uri = put_data.get("uri")
-            patch_res = v.patch(sub_uri, { "active": "true" })
-            if patch_res.status_code == 200:
-                info("Subtitle PATCH success")
-            else:
-                warning("Subtitle PATCH failed")
-        else:
-            warning("Subtitle PUT failed")
-        return {}
-    else:
-        warning("Subtitle creation failed ")
-        warning(res)
-        return None
-
-
-def vimeo_assoc_sub(vimeo_url, sub_uri, lang_code):
-    v = vimeo_client()
-    video_id = vimeo_url.split('/')[-1]
-
-    # Prepare the payload for the subtitle track
-    data = {
-        'type': 'subtitles',
-        'language': lang_code,
-        'name': lang_code,
-    }
+def sub_lang(sub_file):
+    """Language of a subtitle file, the part of its name before the .vtt extension."""
+    return sub_file.name.split(".")[-2]
 
-    # Construct the endpoint URL for adding the text track
-    api_endpoint = f'/videos/{video_id}/texttracks'
 
-    # Send a POST request to add the subtitle track
-    response = v.post(api_endpoint, data=data)
+class TrackIndex(JsonStore):
+    """Persistent map of the published text tracks, by uri, to the ETag of the subtitle file they were uploaded from."""
 
-    # Check the response
-    if response.status_code == 201:
-        info("Subtitle successfully associated with the video.")
-        return response.json()
-    else:
-        warning("Failed to associate subtitle with the video.")
-        return None
+    name = "track index"
 
+    def put(self, track_uri, etag, sub_file, replaces=None):
+        with self.lock:
+            self.entries[track_uri] = {'etag': etag, 'name': sub_file.name}
+            if replaces:
+                self.entries.pop(replaces, None)
+            self._changed()
 
-def list_subs(vimeo_url):
-    video_id = vimeo_url.split('/')[-1]
-    v = vimeo_client()
 
-    # Get text tracks for each video
-    tracks_response = v.get(f'/videos/{video_id}/texttracks')
-    tracks = tracks_response.json()['data']
-    info(f"Found [{len(tracks)}] text tracks for video [{vimeo_url}]")
-    subs = []
-    for track in tracks:
-        track_lang = track.get("language")
-        info("==== track ====")
-        info(pformat(track))
-        subs.append(track_lang)
-    return subs
+def track_index(file_path):
+    return state_file(file_path, "vimeo_tracks.json", TrackIndex)
 
 
-def is_synced_sub(video, vimeo_url, data_folder_uri, sub, lang_code):
-    subs = list_subs(vimeo_url)
-    result = lang_code in subs
-    info(f"Sub found for [{lang_code}] at [{vimeo_url}]: [{result}]")
-    return result
-
-
-def vimeo_upload_subs(video, vimeo_url, data_folder_uri):
-    subs = find_subs(video)
-    info(f"Uploading [{len(subs)}] subs for [{video.name}]")
+def diff_tracks(video, vimeo_url, subs):
+    """The subtitles to publish, as (sub, lang_code, etag, track to replace), against the listed tracks of the video."""
+    index = track_index(video)
+    remote = {}
+    for track in vimeo_state().tracks(vimeo_url):
+        # of several tracks in a language, the one transx published is compared
+        if track.get("language") not in remote or index.get(track.get("uri")):
+            remote[track.get("language")] = track
+    cache = etag_cache(state_path(state_root(video), "etags.json"))
+    changes = []
+    langs = {}
     for sub in subs:
-        sub_name = sub.name
-        lang_code = sub_name.split(".")[0]
-
-        if is_synced_sub(video, vimeo_url, data_folder_uri, sub, lang_code):
-            info("Sub already in sync, skipping")
+        lang_code = sub_lang(sub)
+        if lang_code in langs:
+            # a video has one track per language
+            warning(f"Skipping [{sub}], [{langs[lang_code]}] is already the [{lang_code}] sub of [{video.name}]")
             continue
-
-        info(f"Uploading subtitle [{lang_code}] {sub_name}")
-        sub_uri = vimeo_upload_sub(video, vimeo_url, sub, data_folder_uri, lang_code)
-        if sub_uri:
-            info(f"Subtitle {sub_name} uploaded tp {sub_uri}.")
-            vimeo_assoc_sub(vimeo_url, sub_uri, lang_code)
+        langs[lang_code] = sub
+        etag = local_etags(sub, [WHOLE_FILE], cache)[WHOLE_FILE]
+        track = remote.get(lang_code)
+        if not track:
+            changes.append((sub, lang_code, etag, None))
+            continue
+        published = index.get(track.get("uri"))
+        if not published:
+            # published before tracks were indexed, taken as the current file
+            index.put(track.get("uri"), etag, sub)
+            debug(f"Sub [{lang_code}] already at [{track.get('uri')}], indexed")
+        elif published['etag'] != etag:
+            changes.append((sub, lang_code, etag, track))
         else:
-            info(f"Failed to upload subtitle {sub_name}")
-    return None
+            debug(f"Sub [{lang_code}] already in sync at [{track.get('uri')}]")
+    cache.save()
+    return changes
+
+
+def publish_track(vimeo_url, sub, lang_code, etag, old_track=None):
+    """Creates, uploads and activates the text track of the subtitle, replacing the old one, with the time it took."""
+    started = time.monotonic()
+    report = {"status": "ERROR", "uri": None}
+    tracks_uri = f"/videos/{video_id(vimeo_url)}/texttracks"
+    body = {"type": "subtitles", "language": lang_code, "name": sub.name}
+    res = api("post", tracks_uri, data=body)
+    if res.status_code != 201:
+        warning(f"Failed to create text track [{lang_code}] for [{vimeo_url}]: {res.status_code}")
+    else:
+        track = res.json()
+        # the upload link answers with an empty body, the track is the one just created
+        put_res = api("put", track["link"], data=sub.read_bytes())
+        if put_res.status_code != 200:
+            warning(f"Failed to upload [{sub.name}] to [{track['uri']}]: {put_res.status_code}")
+        else:
+            patch_res = api("patch", track["uri"], data={"active": True})
+            if patch_res.status_code != 200:
+                warning(f"Failed to activate text track [{track['uri']}]: {patch_res.status_code}")
+            else:
+                old_uri = old_track.get("uri") if old_track else None
+                if old_uri:
+                    delete_res = api("delete", old_uri)
+                    if delete_res.status_code not in (200, 204):
+                        warning(f"Failed to delete replaced text track [{old_uri}]: {delete_res.status_code}")
+                vimeo_state().add_track(vimeo_url, track | {"active": True}, replaces=old_uri)
+                track_index(sub).put(track["uri"], etag, sub, replaces=old_uri)
+                report = {"status": "REPLACED" if old_track else "CREATED", "uri": track["uri"]}
+    report["seconds"] = round(time.monotonic() - started, 3)
+    info(f"Sub [{lang_code}] of [{vimeo_url}] {report['status']} in {report['seconds']}s")
+    return report
+
+
+def vimeo_upload_subs(video, vimeo_url, data_folder_uri=None):
+    """Publishes the new and changed subtitles of the video concurrently, reporting each language."""
+    subs = find_subs(video)
+    changes = diff_tracks(video, vimeo_url, subs)
+    info(f"Publishing [{len(changes)}] of [{len(subs)}] subs for [{video.name}]")
+    if not changes:
+        return {}
+    jobs = Config.VIMEO_JOBS.resolve()
+    with ThreadPoolExecutor(max_workers=min(jobs, len(changes))) as executor:
+        futures = {lang_code: executor.submit(publish_track, vimeo_url, sub, lang_code, etag, old_track)
+                   for sub, lang_code, etag, old_track in changes}
+    return {lang_code: future.result() for lang_code, future in futures.items()}
 
 
 def vimeo_sync(video, user_folder):
-    # load data folder
-    data_folder_name = video.parent.name
-    user_folder_uri = user_folder.get("uri")
-    debug(f"Checking vimeo data folder [{data_folder_name}] in user [{user_folder_uri}]")
-    data_folder = get_folder(data_folder_name)
-    if not data_folder:
-        debug(f"Creating vimeo data folder [{data_folder_name}]")
-        create_folder(data_folder_name, user_folder_uri)
-        data_folder = get_folder(data_folder_name)
-        debug(f"Data Folder [{data_folder.get("uri")}] created.")
-    info(f"Data folder [{data_folder_name} found at [{data_folder.get("uri")}]")
-    data_folder_uri = data_folder.get("uri")
-    video_data = get_video(video, data_folder_uri)
-    vimeo_url = video_data.get("uri") if video_data else None
-    info(f"vimeo url for [{video.name}]@[{data_folder_uri}] = [{vimeo_url}]")
-    if not vimeo_url:
-        info(f"Video {str(video.name)} is not synced in [{data_folder_uri}]. uploading...")
-        vimeo_url = vimeo_upload(video, data_folder_uri)
+    """Uploads the video and its subtitles, returning the video url and the sync status."""
+    key = content_key(video)
+    # copies of a file wait for the first one to be published, then reuse its video
+    with vimeo_state().content_lock(key):
+        # a video with an unfinished upload is listed too, but must still be resumed
+        pending = upload_journal(video).get(video)
+        index = video_index(video)
+        published = None if pending else index.get(key)
+        if published:
+            vimeo_url = published['uri']
+            data_folder_uri = published.get('folder_uri')
+            info(f"Video {video.name} already published as [{published['name']}] at [{vimeo_url}]")
+        else:
+            # load data folder
+            data_folder_name = video.parent.name
+            user_folder_uri = user_folder.get("uri")
+            debug(f"Checking vimeo data folder [{data_folder_name}] in user [{user_folder_uri}]")
+            data_folder = ensure_folder(data_folder_name, user_folder_uri)
+            info(f"Data folder [{data_folder_name} found at [{data_folder.get("uri")}]")
+            data_folder_uri = data_folder.get("uri")
+            video_data = None if pending else get_video(video, data_folder_uri)
+            vimeo_url = video_data.get("uri") if video_data else None
+            info(f"vimeo url for [{video.name}]@[{data_folder_uri}] = [{vimeo_url}]")
+            if not vimeo_url:
+                info(f"Video {str(video.name)} is not synced in [{data_folder_uri}]. uploading...")
+                result = vimeo_upload(video, data_folder_uri)
+                if not result.ok:
+                    return {"video": None, "status": "ERROR", "error": result.error}
+                vimeo_url = result.video_uri
+            # the first video published with the content keeps it
+            if not index.get(key):
+                index.put(key, vimeo_url, video, data_folder_uri)
     info(f"Uploading subs of [{video}] to vimeo[{vimeo_url}] folder[{data_folder_uri}]")
-    vimeo_upload_subs(video, vimeo_url, data_folder_uri)
+    subs = vimeo_upload_subs(video, vimeo_url, data_folder_uri)
 
     info(f"Video {str(video)} syncing done.")
-    return {}
+    return {"video": vimeo_url, "status": "DONE", "subs": subs}
 
 
-def run(directory):
+def user_folder():
+    """Finds the vimeo folder of the current user, creating it if needed."""
     uid = vimeo_user_id()
     if not uid:
         error("Could not find vimeo user")
@@ -346,17 +704,36 @@ def run(directory):
         user_folder = get_folder(user_folder_name)
         debug(f"Folder [{user_folder.get("name") if user_folder else "USER_FOLDER_FAILED"}] created.")
     info(f"user folder for [{username}] found [{user_folder.get("uri")}]")
-    videos = find_videos(directory)
-    info(f"Syncing [{len(videos)}] video files to vimeo")
-    for video in videos:
+    return user_folder
+
+
+def run(directory, file_index=None, jobs=None):
+    """Syncs the videos concurrently, all their API calls sharing one rate limiter."""
+    reset_state(file_index.directory if file_index else Config.MEDIA_PATH.resolve(directory))
+    user_folder_data = user_folder()
+    if not user_folder_data:
+        return None
+    videos = find_videos(file_index or directory)
+    jobs = Config.VIMEO_JOBS.resolve(jobs)
+    info(f"Syncing [{len(videos)}] video files to vimeo, [{jobs}] at a time")
+
+    def sync_video(video):
         debug(f"Processing video file {video}")
-        vimeo_sync(video, user_folder)
-    info(f"Processed {len(videos)} videos.")
-    return {}
+        try:
+            return vimeo_sync(video, user_folder_data)["status"]
+        except Exception as e:
+            error(f"Failed to sync video {video}: {e}")
+            return "ERROR"
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        statuses = list(executor.map(sync_video, videos))
+    info(f"Processed {len(videos)} videos, waited for the rate limit {rate_limiter().waits} times.")
+    return {str(video): status for video, status in zip(videos, statuses)}
 
 
 @cmd.cli.command('vimeo')
 @click.option('--directory', default=None, help='Directory to search in')
-def command(directory):
-    result = run(directory)
+@click.option('--jobs', default=None, type=int, help='Number of videos to upload concurrently')
+def command(directory, jobs):
+    result = run(directory, jobs=jobs)
     info(pformat(result))